@@ -0,0 +1,159 @@
+"""Описание того, как модели отдаются в JSON API.
+
+Ресурс — набор полей и вложений. Клиент выбирает поля параметром
+`fields=id,text` и встраивает связанные объекты параметром
+`include=author,group`; под выбранное подбирается `select_related`, так
+что страница списка читается одним запросом независимо от вложений.
+"""
+from django.core.exceptions import ObjectDoesNotExist
+
+
+class ApiError(ValueError):
+    pass
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def _stat(user, name):
+    try:
+        return getattr(user.stats, name)
+    except ObjectDoesNotExist:
+        return None
+
+
+class Field:
+    def __init__(self, getter, related=None):
+        self.getter = getter
+        # что подтянуть через select_related для этого поля
+        self.related = related
+
+
+class Include:
+    """Связанный объект, встраиваемый целиком вместо ссылки на него."""
+
+    def __init__(self, resource, attribute, related):
+        self.resource = resource
+        self.attribute = attribute
+        self.related = related
+
+
+class Resource:
+    def __init__(self, fields, includes=None):
+        self.fields = fields
+        self.includes = includes or {}
+
+    def _names(self, value, allowed, param):
+        if not value:
+            return []
+        names = [name.strip() for name in value.split(',') if name.strip()]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ApiError(
+                f'{param}: неизвестные значения {", ".join(unknown)}; '
+                f'допустимы {", ".join(allowed)}'
+            )
+        return names
+
+    def shape(self, params):
+        """Форма ответа по параметрам `fields` и `include` запроса."""
+        fields = self._names(params.get('fields'), self.fields, 'fields')
+        includes = self._names(params.get('include'), self.includes,
+                               'include')
+        return Shape(self, fields or list(self.fields), includes)
+
+    def dump(self, obj):
+        return {name: field.getter(obj) for name, field in self.fields.items()}
+
+
+class Shape:
+    def __init__(self, resource, fields, includes):
+        self.resource = resource
+        self.fields = fields
+        self.includes = includes
+
+    def prepare(self, queryset):
+        related = {
+            self.resource.fields[name].related for name in self.fields
+        } | {
+            self.resource.includes[name].related for name in self.includes
+        }
+        related.discard(None)
+        return queryset.select_related(*sorted(related))
+
+    def dump(self, obj):
+        data = {
+            name: self.resource.fields[name].getter(obj)
+            for name in self.fields
+        }
+        for name in self.includes:
+            include = self.resource.includes[name]
+            value = getattr(obj, include.attribute)
+            data[name] = None if value is None else include.resource.dump(
+                value)
+        return data
+
+
+users = Resource({
+    'id': Field(lambda user: user.pk),
+    'username': Field(lambda user: user.username),
+    'first_name': Field(lambda user: user.first_name),
+    'last_name': Field(lambda user: user.last_name),
+    'posts_count': Field(lambda user: _stat(user, 'posts_count'), 'stats'),
+    'followers_count': Field(
+        lambda user: _stat(user, 'followers_count'), 'stats'),
+    'following_count': Field(
+        lambda user: _stat(user, 'following_count'), 'stats'),
+})
+
+groups = Resource({
+    'id': Field(lambda group: group.pk),
+    'slug': Field(lambda group: group.slug),
+    'title': Field(lambda group: group.title),
+    'description': Field(lambda group: group.description),
+})
+
+posts = Resource(
+    {
+        'id': Field(lambda post: post.pk),
+        'text': Field(lambda post: post.text),
+        'pub_date': Field(lambda post: _date(post.pub_date)),
+        'updated': Field(lambda post: _date(post.updated)),
+        'author': Field(lambda post: post.author.username, 'author'),
+        'group': Field(
+            lambda post: post.group.slug if post.group else None, 'group'),
+        'image': Field(lambda post: post.image.url if post.image else None),
+        'comments_count': Field(lambda post: post.comments_count),
+    },
+    {
+        'author': Include(users, 'author', 'author__stats'),
+        'group': Include(groups, 'group', 'group'),
+    },
+)
+
+comments = Resource(
+    {
+        'id': Field(lambda comment: comment.pk),
+        'post': Field(lambda comment: comment.post_id),
+        'author': Field(
+            lambda comment: comment.author.username, 'author'),
+        'text': Field(lambda comment: comment.text),
+        'created': Field(lambda comment: _date(comment.created)),
+    },
+    {
+        'author': Include(users, 'author', 'author__stats'),
+    },
+)
+
+follows = Resource(
+    {
+        'id': Field(lambda follow: follow.pk),
+        'user': Field(lambda follow: follow.user.username, 'user'),
+        'author': Field(lambda follow: follow.author.username, 'author'),
+    },
+    {
+        'user': Include(users, 'user', 'user__stats'),
+        'author': Include(users, 'author', 'author__stats'),
+    },
+)
@@ -0,0 +1,229 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import services
+from posts.models import Comment, FeedEntry, Follow, Group, Post
+from posts.tests.utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class ApiTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='api', description='-')
+        for number in range(5):
+            author = User.objects.create_user(username=f'author{number}')
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author, group=cls.group, text=f'пост {number}')
+            Comment.objects.create(post=post, author=cls.reader, text='!')
+        cls.post = post
+
+    def setUp(self):
+        self.client = Client()
+
+    def get_json(self, url, budget, **params):
+        query = '&'.join(f'{key}={value}' for key, value in params.items())
+        return self.assertQueryBudget(
+            self.client, f'{url}?{query}', budget).json()
+
+    def test_query_budgets(self):
+        """Вложения не добавляют запросов."""
+        budgets = {
+            reverse('api:post_list'): 1,
+            reverse('api:post_detail', args=[self.post.pk]): 1,
+            reverse('api:comment_list', args=[self.post.pk]): 2,
+            reverse('api:group_list'): 1,
+            reverse('api:group_detail', args=[self.group.slug]): 1,
+            reverse('api:user_detail', args=['reader']): 1,
+            reverse('api:follow_list'): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.client, url, budget)
+        self.get_json(reverse('api:post_list'), 1, include='author,group')
+        self.get_json(reverse('api:follow_list'), 1, include='user,author')
+
+    def test_sparse_fields_and_include(self):
+        data = self.get_json(reverse('api:post_list'), 1,
+                             fields='id,text', include='author')
+        first = data['results'][0]
+        self.assertEqual(set(first), {'id', 'text', 'author'})
+        self.assertEqual(first['text'], 'пост 4')
+        self.assertEqual(first['author']['username'], 'author4')
+        self.assertEqual(first['author']['posts_count'], 1)
+
+    def test_cursor_pagination(self):
+        url = reverse('api:post_list')
+        first = self.client.get(url, {'limit': 3, 'fields': 'id'}).json()
+        self.assertEqual(len(first['results']), 3)
+        self.assertIsNone(first['previous'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(len(second['results']), 2)
+        self.assertIsNone(second['next'])
+        ids = [post['id'] for post in first['results'] + second['results']]
+        self.assertEqual(
+            ids, list(Post.objects.values_list('pk', flat=True)))
+
+    def test_filters(self):
+        data = self.client.get(reverse('api:follow_list'),
+                               {'author': 'author1'}).json()
+        self.assertEqual(data['results'],
+                         [{'id': data['results'][0]['id'],
+                           'user': 'reader', 'author': 'author1'}])
+        data = self.client.get(reverse('api:post_list'),
+                               {'group': 'missing'}).json()
+        self.assertEqual(data['results'], [])
+
+    def test_errors(self):
+        response = self.client.get(reverse('api:post_list'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['error'])
+        response = self.client.get(reverse('api:post_detail', args=[999]))
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post(reverse('api:post_list'))
+        self.assertEqual(response.status_code, 405)
+
+
+class BatchApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='batcher')
+        cls.authors = [
+            User.objects.create_user(username=f'writer{number}')
+            for number in range(3)
+        ]
+        cls.posts = [
+            Post.objects.create(author=author, text='текст')
+            for author in cls.authors
+        ]
+        Follow.objects.create(user=cls.user, author=cls.authors[0])
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def post_json(self, name, items):
+        return self.client.post(reverse(f'api:{name}'), json.dumps(
+            {'items': items}), content_type='application/json')
+
+    def test_follow_batch(self):
+        """Итог по каждой операции, счётчики и ленты в одной пачке."""
+        items = [
+            {'op': 'follow', 'author': 'writer1'},
+            {'op': 'follow', 'author': 'writer1'},
+            {'op': 'follow', 'author': 'writer2'},
+            {'op': 'unfollow', 'author': 'writer2'},
+            {'op': 'unfollow', 'author': 'writer0'},
+            {'op': 'unfollow', 'author': 'writer0'},
+            {'op': 'follow', 'author': 'nobody'},
+            {'op': 'follow', 'author': 'batcher'},
+            {'op': 'like', 'author': 'writer1'},
+        ]
+        response = self.post_json('follow_batch', items)
+        self.assertEqual(response.status_code, 200)
+        statuses = [item['status'] for item in response.json()['results']]
+        self.assertEqual(statuses, [
+            'created', 'exists', 'created', 'deleted', 'deleted', 'missing',
+            'error', 'error', 'error',
+        ])
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.user).values_list(
+                'author__username', flat=True)),
+            ['writer1'],
+        )
+        self.assertEqual(
+            list(FeedEntry.objects.filter(user=self.user).values_list(
+                'post_id', flat=True)),
+            [self.posts[1].pk],
+        )
+        stats = {
+            user.username: (user.stats.followers_count,
+                            user.stats.following_count)
+            for user in User.objects.select_related('stats')
+        }
+        self.assertEqual(stats, {
+            'batcher': (0, 1),
+            'writer0': (0, 0),
+            'writer1': (1, 0),
+            'writer2': (0, 0),
+        })
+
+    def test_follow_batch_counts_only_changed_rows(self):
+        """Подписки, изменённые параллельным запросом, не сдвигают счётчики."""
+        plan = services._FollowPlan
+
+        def stale_plan(user, authors, existing):
+            # пачка не видит подписку, уже созданную параллельным запросом
+            return plan(user, authors, set())
+
+        with mock.patch.object(services, '_FollowPlan', stale_plan):
+            results = self.post_json(
+                'follow_batch', [{'op': 'follow', 'author': 'writer0'}]
+            ).json()['results']
+        self.assertEqual(results[0]['status'], 'created')
+        self.assertEqual(User.objects.get(
+            pk=self.authors[0].pk).stats.followers_count, 1)
+        self.assertEqual(
+            User.objects.get(pk=self.user.pk).stats.following_count, 1)
+
+    def test_follow_batch_query_count(self):
+        """Число запросов не зависит от размера пачки."""
+        authors = User.objects.bulk_create([
+            User(username=f'bulk{number}') for number in range(20)])
+        items = [{'op': 'follow', 'author': author.username}
+                 for author in authors]
+        with self.assertNumQueries(13):
+            self.post_json('follow_batch', items)
+        items = [dict(item, op='unfollow') for item in items]
+        # пользователь теперь берётся из кеша (users.middleware)
+        with self.assertNumQueries(11):
+            self.post_json('follow_batch', items)
+        self.assertFalse(Follow.objects.filter(
+            user=self.user, author__username__startswith='bulk').exists())
+
+    def test_comment_batch(self):
+        items = [
+            {'post': str(self.posts[0].pk), 'text': 'первый'},
+            {'post': self.posts[0].pk, 'text': 'второй'},
+            {'post': str(self.posts[1].pk), 'text': ''},
+            {'post': '999', 'text': 'мимо'},
+        ]
+        with self.assertNumQueries(7):
+            response = self.post_json('comment_batch', items)
+        results = response.json()['results']
+        self.assertEqual([item['status'] for item in results],
+                         ['created', 'created', 'error', 'error'])
+        self.assertIn('text', results[2]['errors'])
+        texts = self.posts[0].comments.order_by('pk').values_list(
+            'text', flat=True)
+        self.assertEqual(list(texts), ['первый', 'второй'])
+        counts = dict(Post.objects.values_list('pk', 'comments_count'))
+        self.assertEqual(counts[self.posts[0].pk], 2)
+        self.assertEqual(counts[self.posts[1].pk], 0)
+
+    def test_batch_errors(self):
+        response = self.post_json('comment_batch', [{'post': 1}])
+        self.assertEqual(response.status_code, 400)
+        response = self.post_json('follow_batch', [])
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            reverse('api:follow_batch'), 'не json',
+            content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api:follow_batch'))
+        self.assertEqual(response.status_code, 405)
+        response = Client().post(
+            reverse('api:follow_batch'), '{"items": []}',
+            content_type='application/json')
+        self.assertEqual(response.status_code, 401)
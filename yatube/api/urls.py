@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.post_list, name='post_list'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         views.comment_list, name='comment_list'),
+    path('groups/', views.group_list, name='group_list'),
+    path('groups/<slug:slug>/', views.group_detail, name='group_detail'),
+    path('users/<str:username>/', views.user_detail, name='user_detail'),
+    path('follows/', views.follow_list, name='follow_list'),
+    path('follows/batch/', views.follow_batch, name='follow_batch'),
+    path('comments/batch/', views.comment_batch, name='comment_batch'),
+]
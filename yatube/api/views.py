@@ -0,0 +1,184 @@
+import json
+from functools import wraps
+
+from django.http import JsonResponse
+from django.utils.http import urlencode
+from django.views.decorators.http import require_GET, require_POST
+
+from core.db import replica_reads
+from posts import services
+from posts.models import Comment, Follow, Group, Post, User
+from posts.paginators import CursorPaginator
+
+from . import resources
+from .resources import ApiError
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# больше операций в одном пакетном запросе не принимается
+MAX_BATCH = 500
+
+
+def json_response(data, status=200):
+    return JsonResponse(
+        data, status=status, json_dumps_params={'ensure_ascii': False})
+
+
+def error(message, status=400):
+    return json_response({'error': message}, status=status)
+
+
+def _limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('limit: нужно целое число')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _page_url(request, cursor):
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return request.build_absolute_uri(
+        f'{request.path}?{urlencode(sorted(params.items()))}')
+
+
+def list_response(request, resource, queryset, key):
+    """Страница объектов по курсору в форме, заданной параметрами."""
+    try:
+        shape = resource.shape(request.GET)
+        paginator = CursorPaginator(
+            shape.prepare(queryset), _limit(request), key=key)
+    except ApiError as exc:
+        return error(str(exc))
+    page = paginator.get_page(request.GET.get('cursor'))
+    return json_response({
+        'results': [shape.dump(obj) for obj in page],
+        'next': (
+            _page_url(request, page.next_cursor)
+            if page.has_next() else None
+        ),
+        'previous': (
+            _page_url(request, page.previous_cursor)
+            if page.has_previous() else None
+        ),
+    })
+
+
+def detail_response(request, resource, queryset, **lookup):
+    try:
+        shape = resource.shape(request.GET)
+    except ApiError as exc:
+        return error(str(exc))
+    obj = shape.prepare(queryset).filter(**lookup).first()
+    if obj is None:
+        return error('Не найдено', status=404)
+    return json_response(shape.dump(obj))
+
+
+@require_GET
+@replica_reads
+def post_list(request):
+    posts = Post.objects.all()
+    if request.GET.get('group'):
+        posts = posts.filter(group__slug=request.GET['group'])
+    if request.GET.get('author'):
+        posts = posts.filter(author__username=request.GET['author'])
+    return list_response(request, resources.posts, posts, 'pub_date')
+
+
+@require_GET
+@replica_reads
+def post_detail(request, post_id):
+    return detail_response(request, resources.posts, Post.objects.all(),
+                           pk=post_id)
+
+
+@require_GET
+@replica_reads
+def comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error('Не найдено', status=404)
+    return list_response(request, resources.comments,
+                         Comment.objects.filter(post_id=post_id), 'created')
+
+
+@require_GET
+@replica_reads
+def group_list(request):
+    return list_response(request, resources.groups, Group.objects.all(),
+                         'id')
+
+
+@require_GET
+@replica_reads
+def group_detail(request, slug):
+    return detail_response(request, resources.groups, Group.objects.all(),
+                           slug=slug)
+
+
+@require_GET
+@replica_reads
+def user_detail(request, username):
+    return detail_response(request, resources.users, User.objects.all(),
+                           username=username)
+
+
+@require_GET
+@replica_reads
+def follow_list(request):
+    follows = Follow.objects.all()
+    if request.GET.get('user'):
+        follows = follows.filter(user__username=request.GET['user'])
+    if request.GET.get('author'):
+        follows = follows.filter(author__username=request.GET['author'])
+    return list_response(request, resources.follows, follows, 'id')
+
+
+def _batch(request, fields):
+    """Список операций из JSON-тела `{"items": [...]}`.
+
+    У каждой операции должны быть строковые поля `fields`.
+    """
+    try:
+        items = json.loads(request.body.decode())['items']
+    except (ValueError, TypeError, KeyError):
+        raise ApiError('Ожидается JSON вида {"items": [...]}')
+    if not isinstance(items, list) or not items:
+        raise ApiError('items: нужен непустой список')
+    if len(items) > MAX_BATCH:
+        raise ApiError(f'items: не больше {MAX_BATCH} операций')
+    for number, item in enumerate(items):
+        if not isinstance(item, dict) or not all(
+                isinstance(item.get(field), str) for field in fields):
+            raise ApiError(
+                f'items[{number}]: нужны строки {", ".join(fields)}')
+    return items
+
+
+def batch_view(fields):
+    def decorator(view):
+        @require_POST
+        @wraps(view)
+        def wrapper(request):
+            if not request.user.is_authenticated:
+                return error('Нужна авторизация', status=401)
+            try:
+                items = _batch(request, fields)
+            except ApiError as exc:
+                return error(str(exc))
+            return json_response({'results': view(request, items)})
+        return wrapper
+    return decorator
+
+
+@batch_view(['op', 'author'])
+def follow_batch(request, items):
+    return services.apply_follows(
+        request.user, [(item['op'], item['author']) for item in items])
+
+
+@batch_view(['text'])
+def comment_batch(request, items):
+    return services.add_comments(request.user, items)
@@ -0,0 +1,401 @@
+"""Замер страниц на синтетических данных.
+
+Для каждого именованного маршрута `posts.urls` и `users.urls` измеряются
+время ответа, число SQL-запросов и размер отданной страницы; результат
+сверяется с бюджетами, чтобы ловить регрессии вроде забытого
+`select_related`. `explain` прогоняет запросы каждой страницы через
+`EXPLAIN QUERY PLAN` и находит полные просмотры таблиц.
+
+`write_contention` сравнивает настройки SQLite под конкурентной записью:
+несколько потоков добавляют комментарии, пока другие читают ленту.
+"""
+import itertools
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from faker import Faker
+
+from core.sqlite import apply_pragmas
+
+from posts import urls as posts_urls
+from posts.counters import recount
+from posts.feed import rebuild_feeds
+from posts.models import Comment, Follow, Group, Post
+from users import urls as users_urls
+
+User = get_user_model()
+
+ROUTES = (
+    ('posts', posts_urls),
+    ('auth', users_urls),
+)
+
+DEFAULT_SIZES = {
+    'users': 20000,
+    'groups': 50,
+    'posts': 200000,
+    'comments': 200000,
+    'follows': 200000,
+}
+
+# столько авторов читает пользователь, от имени которого идут запросы
+READER_FOLLOWS = 50
+
+METRICS = ('queries', 'median_ms', 'bytes')
+
+# планы запросов, которые стоит объяснять
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+# маршруты, меняющие состояние, замеряются по одному разу на автора,
+# на которого читатель ещё не подписан
+ONE_SHOT_ROUTES = ('posts:profile_follow', 'posts:profile_unfollow')
+
+
+def _bulk_create(model, objects, batch_size):
+    objects = iter(objects)
+    while True:
+        batch = list(itertools.islice(objects, batch_size))
+        if not batch:
+            return
+        model.objects.bulk_create(batch)
+
+
+def seed(users, groups, posts, comments, follows,
+         batch_size=5000, random_seed=0):
+    """Наполняет базу синтетическими пользователями, постами и т.д."""
+    fake = Faker('ru_RU')
+    fake.seed_instance(random_seed)
+    rnd = random.Random(random_seed)
+    texts = [fake.paragraph(nb_sentences=5) for _ in range(500)]
+    password = make_password(None)
+
+    _bulk_create(User, (
+        User(username=f'bench{number}', first_name=fake.first_name(),
+             last_name=fake.last_name(), password=password)
+        for number in range(users)
+    ), batch_size)
+    _bulk_create(Group, (
+        Group(title=fake.catch_phrase(), slug=f'bench-{number}',
+              description=rnd.choice(texts))
+        for number in range(groups)
+    ), batch_size)
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True)) + [None]
+
+    _bulk_create(Post, (
+        Post(author_id=rnd.choice(user_ids), group_id=rnd.choice(group_ids),
+             text=rnd.choice(texts))
+        for _ in range(posts)
+    ), batch_size)
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    if post_ids:
+        _bulk_create(Comment, (
+            Comment(post_id=rnd.choice(post_ids),
+                    author_id=rnd.choice(user_ids),
+                    text=rnd.choice(texts)[:200])
+            for _ in range(comments)
+        ), batch_size)
+
+    reader, others = user_ids[0], user_ids[1:]
+    pairs = {
+        (reader, author)
+        for author in rnd.sample(others, min(READER_FOLLOWS, len(others)))
+    }
+    attempts = 0
+    while len(pairs) < follows and attempts < follows * 3 and others:
+        attempts += 1
+        user, author = rnd.choice(user_ids), rnd.choice(user_ids)
+        if user != author:
+            pairs.add((user, author))
+    _bulk_create(Follow, (
+        Follow(user_id=user, author_id=author) for user, author in pairs
+    ), batch_size)
+    recount()
+    rebuild_feeds()
+
+
+def sample_kwargs(reader):
+    """Значения параметров маршрутов для замеров от имени `reader`."""
+    post = Post.objects.filter(author=reader).first()
+    if post is None:
+        post = Post.objects.create(author=reader, text='benchmark')
+    followed = Follow.objects.filter(user=reader).values('author')
+    author = User.objects.filter(pk__in=followed).first() or reader
+    stranger = User.objects.exclude(pk__in=followed).exclude(
+        pk=reader.pk).first() or reader
+    group = Group.objects.first()
+    return {
+        'slug': group.slug if group else 'missing',
+        'username': author.username,
+        'post_id': post.pk,
+        'stranger': stranger.username,
+    }
+
+
+def route_urls(kwargs):
+    """Пары (имя маршрута, URL) для всех именованных маршрутов."""
+    for namespace, module in ROUTES:
+        for pattern in module.urlpatterns:
+            if not pattern.name:
+                continue
+            name = f'{namespace}:{pattern.name}'
+            params = {key: kwargs[key] for key in pattern.pattern.converters}
+            if name in ONE_SHOT_ROUTES:
+                params['username'] = kwargs['stranger']
+            yield name, reverse(name, kwargs=params)
+
+
+def _clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+def measure(url, user, repeat):
+    """Замер `url`; запросы и размер — по первому ответу, с пустыми кешами.
+
+    На тёплых кешах страница почти не ходит в базу, и бюджет не поймал бы
+    ни забытый `select_related`, ни N+1.
+    """
+    timings = []
+    cold = None
+    for _ in range(repeat):
+        client = Client()
+        client.force_login(user)
+        if cold is None:
+            _clear_caches()
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - start) * 1000)
+        if cold is None:
+            cold = len(queries), len(response.content)
+    return {
+        'url': url,
+        'status': response.status_code,
+        'queries': cold[0],
+        'bytes': cold[1],
+        'cold_ms': round(timings[0], 2),
+        'median_ms': round(statistics.median(timings), 2),
+    }
+
+
+def run(repeat=5, reader=None):
+    """Отчёт о замерах всех маршрутов."""
+    reader = reader or User.objects.order_by('pk').first()
+    kwargs = sample_kwargs(reader)
+    return {
+        'dataset': {
+            'users': User.objects.count(),
+            'posts': Post.objects.count(),
+            'comments': Comment.objects.count(),
+            'follows': Follow.objects.count(),
+        },
+        'repeat': repeat,
+        'routes': {
+            name: measure(
+                url, reader, 1 if name in ONE_SHOT_ROUTES else repeat)
+            for name, url in route_urls(kwargs)
+        },
+    }
+
+
+def load_budgets(path):
+    with open(path, encoding='utf-8') as budgets_file:
+        return json.load(budgets_file)
+
+
+def check_budgets(report, budgets):
+    """Список нарушений бюджетов; пустой, если всё в порядке."""
+    violations = []
+    for name, limits in budgets.items():
+        result = report['routes'].get(name)
+        if result is None:
+            violations.append(f'{name}: маршрут не замерялся')
+            continue
+        for metric in METRICS:
+            if metric in limits and result[metric] > limits[metric]:
+                violations.append(
+                    f'{name}: {metric} = {result[metric]}, '
+                    f'бюджет {limits[metric]}'
+                )
+    return violations
+
+
+def capture_queries(url, user):
+    """SQL-запросы страницы без кешей; изменения в базе откатываются."""
+    dummy = {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    with override_settings(
+            CACHES={alias: dummy for alias in settings.CACHES}):
+        with transaction.atomic():
+            client = Client()
+            client.force_login(user)
+            with CaptureQueriesContext(connection) as queries:
+                client.get(url)
+            transaction.set_rollback(True)
+    return [query['sql'] for query in queries]
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def is_full_scan(detail):
+    """Полный просмотр таблицы, а не поиск по индексу."""
+    # формат зависит от версии SQLite: «SCAN TABLE t» или «SCAN t»
+    detail = detail.upper()
+    return (
+        detail.startswith('SCAN ')
+        and 'USING' not in detail
+        and 'SUBQUERY' not in detail
+        and 'CONSTANT ROW' not in detail
+    )
+
+
+def explain(reader=None):
+    """Полные просмотры таблиц в запросах каждого маршрута (только SQLite)."""
+    reader = reader or User.objects.order_by('pk').first()
+    report = {}
+    for name, url in route_urls(sample_kwargs(reader)):
+        statements = [
+            sql for sql in dict.fromkeys(capture_queries(url, reader))
+            if sql.lstrip().upper().startswith(EXPLAINED_STATEMENTS)
+        ]
+        scans = [
+            {'sql': sql, 'detail': detail}
+            for sql in statements
+            for detail in query_plan(sql)
+            if is_full_scan(detail)
+        ]
+        report[name] = {
+            'url': url, 'queries': len(statements), 'scans': scans}
+    return report
+
+
+# настройки SQLite по умолчанию у Django: журнал отката и 5 секунд ожидания
+ROLLBACK_JOURNAL = {'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+DEFAULT_SQLITE_TIMEOUT = 5
+
+CONTENTION_SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT,'
+    ' comments_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER,'
+    ' text TEXT, created REAL)',
+    'CREATE INDEX comment_post ON comment (post_id, created)',
+)
+
+
+def _contention_db(path, posts):
+    with sqlite3.connect(path) as db:
+        for sql in CONTENTION_SCHEMA:
+            db.execute(sql)
+        db.executemany(
+            'INSERT INTO post (id, text) VALUES (?, ?)',
+            ((pk, 'текст поста ' * 20) for pk in range(1, posts + 1)),
+        )
+
+
+def _add_comments(db, begin, posts, writes, rng):
+    """То же, что `add_comment`; возвращает (успешных, заблокированных)."""
+    committed = locked = 0
+    for _ in range(writes):
+        post_id = rng.randint(1, posts)
+        try:
+            db.execute(begin)
+            db.execute('SELECT id FROM post WHERE id = ?', [post_id])
+            db.execute(
+                'INSERT INTO comment (post_id, text, created)'
+                ' VALUES (?, ?, ?)', [post_id, 'комментарий', time.time()])
+            db.execute(
+                'UPDATE post SET comments_count = comments_count + 1'
+                ' WHERE id = ?', [post_id])
+            db.execute('COMMIT')
+            committed += 1
+        except sqlite3.OperationalError:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            locked += 1
+    return committed, locked
+
+
+def _read_comments(db, posts, done, rng):
+    reads = 0
+    while not done.is_set():
+        try:
+            db.execute(
+                'SELECT * FROM comment WHERE post_id = ?'
+                ' ORDER BY created DESC LIMIT 10',
+                [rng.randint(1, posts)]).fetchall()
+            reads += 1
+        except sqlite3.OperationalError:
+            pass
+    return reads
+
+
+def write_contention(pragmas, timeout, begin='BEGIN', writers=8, readers=4,
+                     writes=100, posts=200):
+    """Пропускная способность записи при параллельных чтениях.
+
+    Каждый писатель `writes` раз делает то же, что `add_comment`: в одной
+    транзакции читает пост, вставляет комментарий и сдвигает счётчик.
+    Читатели, пока идут записи, выбирают страницу комментариев. Ошибки
+    `database is locked` не повторяются, а считаются. `begin` — чем
+    начинается транзакция: `BEGIN` или `BEGIN IMMEDIATE`.
+    """
+    directory = tempfile.TemporaryDirectory()
+    path = os.path.join(directory.name, 'contention.sqlite3')
+    _contention_db(path, posts)
+    done = threading.Event()
+    results = {'write': [], 'read': []}
+
+    def work(kind, seed):
+        db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        apply_pragmas(db, pragmas)
+        rng = random.Random(seed)
+        if kind == 'write':
+            result = _add_comments(db, begin, posts, writes, rng)
+        else:
+            result = _read_comments(db, posts, done, rng)
+        db.close()
+        results[kind].append(result)
+
+    writer_threads = [threading.Thread(target=work, args=('write', seed))
+                      for seed in range(writers)]
+    reader_threads = [threading.Thread(target=work, args=('read', seed))
+                      for seed in range(readers)]
+    start = time.perf_counter()
+    for thread in reader_threads + writer_threads:
+        thread.start()
+    for thread in writer_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in reader_threads:
+        thread.join()
+    directory.cleanup()
+
+    committed = sum(result[0] for result in results['write'])
+    reads = sum(results['read'])
+    return {
+        'committed': committed,
+        'locked': sum(result[1] for result in results['write']),
+        'reads': reads,
+        'seconds': round(elapsed, 3),
+        'writes_per_second': round(committed / elapsed, 1),
+        'reads_per_second': round(reads / elapsed, 1),
+    }
@@ -0,0 +1,219 @@
+"""Кеш в отдельном файле SQLite, общий для всех процессов-воркеров.
+
+В отличие от `LocMemCache` данные видны всем процессам на машине, а в
+отличие от `DatabaseCache` кеш не делит соединение и блокировки с
+основной базой. Файл открывается в режиме WAL, поэтому читатели не
+ждут писателей.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+            'OPTIONS': {'TABLE': 'cache_default'},
+        },
+    }
+"""
+import os
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# ограничение SQLite на число параметров запроса
+MAX_PARAMS = 500
+
+
+def _chunks(items, size=MAX_PARAMS):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._table = options.get('TABLE', 'cache')
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', self._table):
+            raise ValueError(f'Недопустимое имя таблицы кеша: {self._table}')
+        self._busy_timeout = options.get('TIMEOUT', 5)
+        self._local = threading.local()
+
+    def _connection(self):
+        # соединение своё у каждого потока и у каждого процесса после fork
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None and self._local.pid == os.getpid():
+            return connection
+        directory = os.path.dirname(self._path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path, timeout=self._busy_timeout, isolation_level=None,
+            check_same_thread=False,
+        )
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+        connection.execute(
+            f'CREATE TABLE IF NOT EXISTS {self._table} ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+        )
+        connection.execute(
+            f'CREATE INDEX IF NOT EXISTS {self._table}_expires '
+            f'ON {self._table} (expires)'
+        )
+        self._local.connection = connection
+        self._local.pid = os.getpid()
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _fresh(self, expires):
+        return expires is None or expires > time.time()
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            f'SELECT value, expires FROM {self._table} WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or not self._fresh(row[1]):
+            return default
+        return pickle.loads(row[0])
+
+    def get_many(self, keys, version=None):
+        keys_map = {self._key(key, version): key for key in keys}
+        found = {}
+        connection = self._connection()
+        for chunk in _chunks(keys_map):
+            placeholders = ', '.join('?' * len(chunk))
+            rows = connection.execute(
+                f'SELECT key, value, expires FROM {self._table} '
+                f'WHERE key IN ({placeholders})', chunk
+            )
+            for key, value, expires in rows:
+                if self._fresh(expires):
+                    found[keys_map[key]] = pickle.loads(value)
+        return found
+
+    def _store(self, connection, key, value, timeout, mode):
+        connection.execute(
+            f'INSERT OR {mode} INTO {self._table} (key, value, expires) '
+            'VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+             self.get_backend_timeout(timeout)),
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            self._store(connection, key, value, timeout, 'REPLACE')
+            self._cull(connection)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction() as connection:
+            for key, value in data.items():
+                self._store(connection, self._key(key, version), value,
+                            timeout, 'REPLACE')
+            self._cull(connection)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            connection.execute(
+                f'DELETE FROM {self._table} WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            before = connection.total_changes
+            self._store(connection, key, value, timeout, 'IGNORE')
+            return connection.total_changes > before
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                f'UPDATE {self._table} SET expires = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                f'SELECT value, expires FROM {self._table} WHERE key = ?',
+                (key,),
+            ).fetchone()
+            if row is None or not self._fresh(row[1]):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                f'UPDATE {self._table} SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), key),
+            )
+            return value
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._connection().execute(
+            f'DELETE FROM {self._table} WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        with self._transaction() as connection:
+            for chunk in _chunks(keys):
+                placeholders = ', '.join('?' * len(chunk))
+                connection.execute(
+                    f'DELETE FROM {self._table} WHERE key IN ({placeholders})',
+                    chunk,
+                )
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        row = self._connection().execute(
+            f'SELECT expires FROM {self._table} WHERE key = ?', (key,)
+        ).fetchone()
+        return row is not None and self._fresh(row[0])
+
+    def clear(self):
+        self._connection().execute(f'DELETE FROM {self._table}')
+
+    def _cull(self, connection):
+        count = connection.execute(
+            f'SELECT COUNT(*) FROM {self._table}').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        connection.execute(
+            f'DELETE FROM {self._table} WHERE expires <= ?', (time.time(),))
+        count = connection.execute(
+            f'SELECT COUNT(*) FROM {self._table}').fetchone()[0]
+        if count > self._max_entries and self._cull_frequency:
+            connection.execute(
+                f'DELETE FROM {self._table} WHERE key IN ('
+                f'SELECT key FROM {self._table} '
+                'ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,),
+            )
+
+    def close(self, **kwargs):
+        # соединение переиспользуется между запросами одного потока
+        pass
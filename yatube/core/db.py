@@ -0,0 +1,173 @@
+"""Чтение с реплик базы данных.
+
+Реплики перечислены в `DATABASE_REPLICAS`; на них уходят только чтения
+внутри view, помеченных `replica_reads`, и только вне транзакции на
+основной базе. Всё остальное — записи, формы, админка, команды — читает
+и пишет основную базу.
+
+Реплика выбирается по кругу (`REPLICA_SELECTION = 'round_robin'`) или с
+наименьшим отставанием (`'least_lag'`); реплики, отставшие больше чем на
+`REPLICA_MAX_LAG` секунд, пропускаются. Отставание SQLite-копий, которыми
+реплики подменяются локально (`manage.py sync_replicas`), считается по
+времени изменения файлов вместе с журналом WAL: в режиме WAL записи
+попадают в `-wal`, а сам файл базы меняется только при checkpoint. Если
+основная база менялась после копии, отставание — возраст копии: оно
+растёт, пока реплику не обновят. Для других баз отставание неизвестно и
+считается нулевым.
+
+Страницы, которые уходят в кеш с версиями лент (`cached_reads`), читают
+только реплики без отставания: версия ленты меняется сразу после записи,
+и отставшая реплика сохранила бы под новой версией старые данные.
+
+Чтобы пользователь сразу видел свои изменения, `ReadYourWritesMiddleware`
+после запроса с записью ставит cookie, и следующие
+`READ_YOUR_WRITES_SECONDS` секунд его чтения идут в основную базу.
+"""
+import contextvars
+import itertools
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE = 'db_pin'
+
+_state = contextvars.ContextVar('db_reads', default=None)
+_counter = itertools.count()
+_lags = {}
+
+
+class ReadState:
+    """Что можно читать с реплик в текущем запросе."""
+
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.replicas = False
+        self.wrote = False
+        # наибольшее допустимое отставание реплики, None — `REPLICA_MAX_LAG`
+        self.max_lag = None
+
+
+def _modified(name):
+    """Время последней записи в базу SQLite, с учётом журнала WAL."""
+    modified = os.path.getmtime(name)
+    try:
+        return max(modified, os.path.getmtime(f'{name}-wal'))
+    except OSError:
+        return modified
+
+
+def replica_lag(alias):
+    """Отставание реплики в секундах, с кешем на `REPLICA_LAG_TTL`."""
+    now = time.monotonic()
+    cached = _lags.get(alias)
+    if cached is not None and now - cached[0] < settings.REPLICA_LAG_TTL:
+        return cached[1]
+    primary = connections[DEFAULT_DB_ALIAS]
+    replica = connections[alias]
+    lag = 0.0
+    if primary.vendor == replica.vendor == 'sqlite':
+        try:
+            copied = _modified(replica.settings_dict['NAME'])
+            if _modified(primary.settings_dict['NAME']) > copied:
+                # реплика не видит записей с момента копии, а не только
+                # разницы между последней записью и копией
+                lag = max(0.0, time.time() - copied)
+        except OSError:
+            pass
+    _lags[alias] = (now, lag)
+    return lag
+
+
+def choose_replica(max_lag=None):
+    """Псевдоним реплики для чтения или None, если годных реплик нет."""
+    if max_lag is None:
+        max_lag = settings.REPLICA_MAX_LAG
+    lags = {
+        alias: replica_lag(alias) for alias in settings.DATABASE_REPLICAS
+    }
+    fresh = [alias for alias, lag in lags.items() if lag <= max_lag]
+    if not fresh:
+        return None
+    if settings.REPLICA_SELECTION == 'least_lag':
+        least = min(lags[alias] for alias in fresh)
+        fresh = [alias for alias in fresh if lags[alias] == least]
+    return fresh[next(_counter) % len(fresh)]
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replicas or state.pinned:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return choose_replica(state.max_lag)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        # объект, прочитанный с реплики, сохраняется всё равно в основную
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+def replica_reads(view):
+    """Разрешает view на GET и HEAD читать с реплик."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        state.replicas = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replicas = False
+    return wrapper
+
+
+@contextmanager
+def cached_reads():
+    """Чтения, которые попадут в долгий кеш: только с неотставших реплик."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous, state.max_lag = state.max_lag, 0
+    try:
+        yield
+    finally:
+        state.max_lag = previous
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = ReadState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1',
+                max_age=settings.READ_YOUR_WRITES_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
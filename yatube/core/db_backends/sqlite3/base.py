@@ -0,0 +1,15 @@
+"""SQLite, в котором транзакции сразу берут блокировку записи.
+
+Django начинает транзакцию с `BEGIN` (DEFERRED): блокировка записи
+берётся только на первом INSERT или UPDATE. Если к этому моменту базу
+изменил другой писатель, SQLite сразу отвечает `database is locked`, не
+дожидаясь таймаута, — прочитанный снимок уже устарел. `BEGIN IMMEDIATE`
+ждёт блокировку в начале транзакции, и конкурирующие записи встают в
+очередь на время `timeout`.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute('BEGIN IMMEDIATE')
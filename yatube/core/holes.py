@@ -0,0 +1,65 @@
+"""«Дырки» в кешируемых страницах для частей, зависящих от пользователя.
+
+Страница кешируется одна на всех, а то, что у каждого пользователя своё
+(шапка с именем, кнопка подписки, форма комментария с CSRF-токеном),
+выводится тегом `{% hole 'имя' аргументы %}`. Пока view рендерит страницу
+для кеша (`request.punch_holes`), тег оставляет вместо фрагмента метку
+`<!--hole:…-->`; `fill` перед ответом заменяет метки фрагментами,
+отрисованными для текущего запроса. Без кеша тег рисует фрагмент сразу.
+
+Фрагмент регистрируется функцией `(request, *args) -> str`; аргументы
+меток — простые значения (числа, строки), они кодируются в JSON.
+"""
+import base64
+import json
+import re
+
+from django.http import HttpResponse
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+HOLE_RE = re.compile(rb'<!--hole:(\w+):([\w-]*)-->')
+
+renderers = {}
+
+
+def register(name):
+    def decorator(func):
+        renderers[name] = func
+        return func
+    return decorator
+
+
+def placeholder(name, args):
+    raw = json.dumps(list(args), separators=(',', ':')).encode()
+    encoded = base64.urlsafe_b64encode(raw).decode().rstrip('=')
+    return mark_safe(f'<!--hole:{name}:{encoded}-->')
+
+
+def render(name, request, *args):
+    return mark_safe(renderers[name](request, *args))
+
+
+def _decode(encoded):
+    raw = base64.urlsafe_b64decode(encoded + b'=' * (-len(encoded) % 4))
+    return json.loads(raw.decode())
+
+
+def fill(response, request):
+    """Новый ответ, в котором метки заменены фрагментами для `request`."""
+    def replace(match):
+        name, args = match.group(1).decode(), _decode(match.group(2))
+        return render(name, request, *args).encode(response.charset)
+
+    filled = HttpResponse(
+        HOLE_RE.sub(replace, response.content),
+        status=response.status_code,
+    )
+    for header, value in response.items():
+        filled[header] = value
+    return filled
+
+
+@register('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
@@ -0,0 +1,72 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import benchmark
+
+DEFAULT_BUDGETS = os.path.join(
+    os.path.dirname(benchmark.__file__), 'benchmark_budgets.json'
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполняет отдельную базу синтетическими данными и замеряет время, '
+        'число SQL-запросов и размер ответа для каждого маршрута'
+    )
+
+    def add_arguments(self, parser):
+        for name, default in benchmark.DEFAULT_SIZES.items():
+            parser.add_argument(f'--{name}', type=int, default=default)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--output', default='benchmark_report.json')
+        parser.add_argument('--budgets', default=DEFAULT_BUDGETS)
+        parser.add_argument(
+            '--keepdb', action='store_true',
+            help='Не удалять базу с данными и не наполнять её повторно',
+        )
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        if options['keepdb'] and connection.vendor == 'sqlite':
+            connection.settings_dict['TEST'].setdefault(
+                'NAME', os.path.join(settings.BASE_DIR, 'benchmark.sqlite3')
+            )
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, keepdb=options['keepdb'],
+            serialize=False,
+        )
+        try:
+            report = self.benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        for name, result in report['routes'].items():
+            self.stdout.write(
+                f"{name:24} {result['status']} {result['median_ms']:>9} ms "
+                f"{result['queries']:>4} sql {result['bytes']:>8} B"
+            )
+        if report['violations']:
+            raise CommandError(
+                'Превышены бюджеты:\n' + '\n'.join(report['violations']))
+        self.stdout.write(self.style.SUCCESS(
+            f"Бюджеты соблюдены, отчёт: {options['output']}"))
+
+    def benchmark(self, options):
+        sizes = {name: options[name] for name in benchmark.DEFAULT_SIZES}
+        if not benchmark.User.objects.exists():
+            self.stdout.write(f'Наполнение базы: {sizes}')
+            benchmark.seed(**sizes)
+        report = benchmark.run(repeat=options['repeat'])
+        budgets = (
+            benchmark.load_budgets(options['budgets'])
+            if options['budgets'] else {}
+        )
+        report['violations'] = benchmark.check_budgets(report, budgets)
+        return report
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает запись в SQLite под конкуренцией с настройками Django '
+        'по умолчанию, с SQLITE_PRAGMAS проекта и с BEGIN IMMEDIATE'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writes', type=int, default=100,
+                            help='Транзакций на каждого писателя')
+
+    def handle(self, *args, **options):
+        timeout = settings.DATABASES['default']['OPTIONS']['timeout']
+        modes = {
+            'rollback journal': (
+                benchmark.ROLLBACK_JOURNAL,
+                benchmark.DEFAULT_SQLITE_TIMEOUT,
+                'BEGIN',
+            ),
+            'WAL + pragmas': (settings.SQLITE_PRAGMAS, timeout, 'BEGIN'),
+            '+ BEGIN IMMEDIATE': (
+                settings.SQLITE_PRAGMAS, timeout, 'BEGIN IMMEDIATE'),
+        }
+        for name, (pragmas, timeout, begin) in modes.items():
+            result = benchmark.write_contention(
+                pragmas, timeout, begin, writers=options['writers'],
+                readers=options['readers'], writes=options['writes'])
+            self.stdout.write(
+                f"{name:18} {result['writes_per_second']:>8} записей/с "
+                f"{result['reads_per_second']:>9} чтений/с "
+                f"{result['locked']:>5} locked "
+                f"({result['seconds']} с)"
+            )
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN QUERY PLAN для SQL-запросов каждой страницы '
+        'и сообщает о полных просмотрах таблиц'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='От имени кого открывать страницы (по умолчанию первый '
+                 'пользователь)',
+        )
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Завершиться ошибкой, если найден полный просмотр',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN поддерживается только '
+                               'для SQLite')
+        users = benchmark.User.objects.order_by('pk')
+        if options['username']:
+            users = users.filter(username=options['username'])
+        reader = users.first()
+        if reader is None:
+            raise CommandError('Нет пользователя, от имени которого '
+                               'открывать страницы')
+
+        report = benchmark.explain(reader)
+        total = 0
+        for name, result in report.items():
+            self.stdout.write(
+                f"{name:24} {result['queries']:>3} sql "
+                f"{len(result['scans']):>3} scan")
+            for scan in result['scans']:
+                self.stdout.write(f"    {scan['detail']}")
+                self.stdout.write(f"        {scan['sql'][:200]}")
+            total += len(result['scans'])
+        if total and options['strict']:
+            raise CommandError(f'Полных просмотров таблиц: {total}')
+        style = self.style.WARNING if total else self.style.SUCCESS
+        self.stdout.write(style(f'Полных просмотров таблиц: {total}'))
@@ -0,0 +1,176 @@
+"""Лёгкое профилирование запросов в рабочем режиме.
+
+`ProfilingMiddleware` замеряет для каждого запроса общее время, число и
+время SQL-запросов, повторяющиеся запросы, время рендеринга шаблонов и
+размер ответа. Запросы дольше `PROFILING_SLOW_MS` пишутся в лог
+`yatube.slow_requests` одной JSON-строкой, а время по каждому view
+копится в памяти процесса и отдаётся персоналу на `/admin/profiling/`.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.base import Template
+
+slow_log = logging.getLogger('yatube.slow_requests')
+
+_current = contextvars.ContextVar('profile', default=None)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # обёртка `connection.execute_wrapper`
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - start) * 1000
+            self.queries += 1
+            self.statements[sql] += 1
+            self.executions[(sql, repr(params))] += 1
+
+    def duplicates(self, limit=5):
+        """Запросы, выполненные больше одного раза (с любыми параметрами)."""
+        repeated = [
+            {
+                'sql': sql[:300],
+                'count': count,
+                'same_params': max(
+                    times for (statement, _), times in self.executions.items()
+                    if statement == sql
+                ),
+            }
+            for sql, count in self.statements.most_common()
+            if count > 1
+        ]
+        return repeated[:limit]
+
+
+def _profiled_render(render):
+    def wrapper(self, context):
+        profile = _current.get()
+        if profile is None:
+            return render(self, context)
+        # вложенные шаблоны ({% include %}) уже учтены во внешнем
+        profile.template_depth += 1
+        start = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            profile.template_depth -= 1
+            if not profile.template_depth:
+                profile.template_ms += (time.perf_counter() - start) * 1000
+    wrapper.profiled = True
+    return wrapper
+
+
+def install_template_timer():
+    if not getattr(Template._render, 'profiled', False):
+        Template._render = _profiled_render(Template._render)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ViewStats:
+    """Последние замеры по каждому view в памяти процесса."""
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.views = defaultdict(lambda: deque(maxlen=self.samples))
+
+    def add(self, view, total_ms, queries, size):
+        with self.lock:
+            self.views[view].append((total_ms, queries, size))
+
+    def snapshot(self):
+        with self.lock:
+            views = {view: list(rows) for view, rows in self.views.items()}
+        report = {}
+        for view, rows in sorted(views.items()):
+            timings, queries, sizes = zip(*rows)
+            report[view] = {
+                'requests': len(rows),
+                'p50_ms': round(percentile(timings, 0.5), 2),
+                'p90_ms': round(percentile(timings, 0.9), 2),
+                'p99_ms': round(percentile(timings, 0.99), 2),
+                'mean_queries': round(sum(queries) / len(rows), 1),
+                'max_queries': max(queries),
+                'max_bytes': max(sizes),
+            }
+        return report
+
+
+view_stats = ViewStats(settings.PROFILING_SAMPLES)
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install_template_timer()
+
+    def __call__(self, request):
+        if not settings.PROFILING_ENABLED:
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.record(request, response, profile)
+        return response
+
+    def record(self, request, response, profile):
+        total_ms = (time.perf_counter() - profile.start) * 1000
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        size = 0 if response.streaming else len(response.content)
+        view_stats.add(view, total_ms, profile.queries, size)
+
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_staff:
+            response['Server-Timing'] = (
+                f'sql;dur={profile.sql_ms:.1f}, '
+                f'tpl;dur={profile.template_ms:.1f}, '
+                f'total;dur={total_ms:.1f}'
+            )
+        if total_ms < settings.PROFILING_SLOW_MS:
+            return
+        slow_log.warning(json.dumps({
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': view,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 2),
+            'queries': profile.queries,
+            'sql_ms': round(profile.sql_ms, 2),
+            'template_ms': round(profile.template_ms, 2),
+            'bytes': size,
+            'duplicates': profile.duplicates(),
+        }, ensure_ascii=False))
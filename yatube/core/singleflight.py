@@ -0,0 +1,122 @@
+"""Защита дорогих промахов кеша от «толпы» запросов.
+
+Когда значения нет в кеше (истекло или сменилась версия ленты), его
+пересчитывает один воркер: он берёт блокировку `cache.add`. Остальные тем
+временем получают прежнее значение ключа (`latest`), если оно есть, или
+ждут до `SINGLE_FLIGHT_WAIT` секунд, пока значение появится, и только
+потом считают сами. Блокировка надёжна, только если `add` атомарен:
+у `FileBasedCache` это не так (см. CACHE_BACKENDS в настройках).
+
+Значение хранится с мягким сроком — за долю `CACHE_REFRESH_AHEAD` до
+истечения. После него первый запрос получает значение как есть и
+пересчитывает ключ в фоне (core.tasks), поэтому популярные ключи обычно
+не истекают вовсе.
+
+Сколько раз выбран каждый путь, считает `stats` в памяти процесса; сводка
+отдаётся на /admin/profiling/.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+from .tasks import run_in_background
+
+LOCK_KEY = 'single-flight:{}'
+POLL_INTERVAL = 0.05
+
+
+class Stats:
+    """Счётчики путей `fetch`: hit, miss, refresh, stale, waited, timeout."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.counts = Counter()
+
+    def add(self, outcome):
+        with self.lock:
+            self.counts[outcome] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.counts)
+
+
+stats = Stats()
+
+
+def _acquire(cache, key):
+    return cache.add(
+        LOCK_KEY.format(key), True, settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+
+
+def _store(cache, key, value, timeout, latest):
+    refresh_at = None
+    if timeout is not None:
+        refresh_at = time.time() + timeout * (
+            1 - settings.CACHE_REFRESH_AHEAD)
+    entries = {key: (value, refresh_at)}
+    if latest is not None:
+        entries[latest] = key
+    cache.set_many(entries, timeout)
+
+
+def _compute(cache, key, compute, timeout, latest, cacheable):
+    try:
+        value = compute()
+        if cacheable is None or cacheable(value):
+            _store(cache, key, value, timeout, latest)
+    finally:
+        cache.delete(LOCK_KEY.format(key))
+    return value
+
+
+def _previous(cache, latest):
+    if latest is None:
+        return None
+    key = cache.get(latest)
+    entry = cache.get(key) if key is not None else None
+    return entry[0] if entry is not None else None
+
+
+def fetch(cache, key, compute, timeout, latest=None, cacheable=None):
+    """Значение `key` из кеша или `compute()`; возвращает `(value, fresh)`.
+
+    `latest` — ключ, под которым запоминается последний сохранённый ключ
+    (например, страница без версий лент): пока значение пересчитывается,
+    отдаётся оно с `fresh=False`. `cacheable(value)` решает, сохранять ли
+    посчитанное значение.
+    """
+    entry = cache.get(key)
+    if entry is not None:
+        value, refresh_at = entry
+        if (refresh_at is not None and time.time() >= refresh_at
+                and _acquire(cache, key)):
+            stats.add('refresh')
+            run_in_background(
+                _compute, cache, key, compute, timeout, latest, cacheable)
+        else:
+            stats.add('hit')
+        return value, True
+    if _acquire(cache, key):
+        stats.add('miss')
+        return _compute(cache, key, compute, timeout, latest,
+                        cacheable), True
+    previous = _previous(cache, latest)
+    if previous is not None:
+        stats.add('stale')
+        return previous, False
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            stats.add('waited')
+            return entry[0], True
+    # блокировка у зависшего воркера: считаем сами, но не сохраняем
+    stats.add('timeout')
+    return compute(), True
@@ -0,0 +1,33 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+Каждое новое соединение Django с базой SQLite получает PRAGMA из
+`SQLITE_PRAGMAS`: журнал WAL (читатели не ждут писателя и наоборот),
+`synchronous=NORMAL` (в WAL это безопасно при падении процесса),
+увеличенный кеш страниц и отображение файла в память. Сколько ждать
+чужой блокировки записи, задаёт `timeout` в `OPTIONS` базы. Соединения
+переиспользуются между запросами (`CONN_MAX_AGE`), так что PRAGMA
+выполняются один раз на соединение, а не на каждый запрос. Транзакции
+начинаются с `BEGIN IMMEDIATE` — см. `core.db_backends.sqlite3`.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+def apply_pragmas(connection, pragmas):
+    """Выполняет PRAGMA на соединении DB-API (`sqlite3` или Django)."""
+    cursor = connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+    finally:
+        cursor.close()
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection.connection, settings.SQLITE_PRAGMAS)
+
+
+def connect_signals():
+    connection_created.connect(
+        configure_connection, dispatch_uid='core.sqlite.configure')
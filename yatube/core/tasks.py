@@ -0,0 +1,48 @@
+"""Фоновое выполнение задач в пуле потоков процесса.
+
+При `BACKGROUND_TASKS_WORKERS = 0` задачи выполняются сразу в текущем
+потоке, это удобно в тестах.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BACKGROUND_TASKS_WORKERS,
+                thread_name_prefix='yatube-task',
+            )
+        return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %r завершилась ошибкой', func)
+    finally:
+        # у потока пула свои соединения с базой, не держим их открытыми
+        connections.close_all()
+
+
+def run_in_background(func, *args, **kwargs):
+    """Ставит `func(*args, **kwargs)` в очередь пула потоков."""
+    if not settings.BACKGROUND_TASKS_WORKERS:
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception('Задача %r завершилась ошибкой', func)
+        return
+    _get_executor().submit(_run, func, args, kwargs)
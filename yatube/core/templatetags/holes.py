@@ -0,0 +1,14 @@
+from django import template
+
+from core import holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, *args):
+    """Фрагмент для текущего пользователя или метка для кеша."""
+    request = context.get('request')
+    if request is not None and getattr(request, 'punch_holes', False):
+        return holes.placeholder(name, args)
+    return holes.render(name, request, *args)
@@ -0,0 +1,363 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.conf import settings
+from django.db import connection, connections
+from django.test import (
+    Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import benchmark, db, singleflight
+from core.cache_backends import SQLiteCache
+from core.middleware import view_stats
+from posts.models import FeedEntry, Post
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        benchmark.seed(users=10, groups=2, posts=40, comments=20, follows=30)
+        cls.report = benchmark.run(repeat=1)
+
+    def test_seed_fills_feeds(self):
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertTrue(FeedEntry.objects.exists())
+
+    def test_every_route_measured(self):
+        """Замерены все именованные маршруты posts и users."""
+        routes = self.report['routes']
+        self.assertIn('posts:index', routes)
+        self.assertIn('auth:login', routes)
+        for name, result in routes.items():
+            with self.subTest(name=name):
+                self.assertIn(result['status'], (200, 302))
+                self.assertGreaterEqual(result['queries'], 0)
+
+    def test_queries_counted_on_cold_caches(self):
+        """Тёплый кеш страниц не прячет запросы от бюджета."""
+        url = reverse('posts:index')
+        reader = get_user_model().objects.order_by('pk').first()
+        first = benchmark.measure(url, reader, 2)
+        again = benchmark.measure(url, reader, 2)
+        self.assertEqual(again['queries'], first['queries'])
+        # сессия, пользователь, число постов и страница постов
+        self.assertGreaterEqual(again['queries'], 4)
+
+    def test_budget_violation_reported(self):
+        budgets = {'posts:post_detail': {'queries': 0}}
+        self.assertEqual(
+            len(benchmark.check_budgets(self.report, budgets)), 1)
+        self.assertEqual(
+            benchmark.check_budgets(self.report, {'posts:index': {}}), [])
+
+    def test_feeds_use_indexes(self):
+        """Ленты группы, автора и пост читаются по индексам."""
+        report = benchmark.explain()
+        for name in ('posts:group_list', 'posts:profile',
+                     'posts:post_detail', 'posts:follow_index'):
+            with self.subTest(name=name):
+                self.assertEqual(report[name]['scans'], [])
+
+    def test_full_scan_detected(self):
+        self.assertTrue(benchmark.is_full_scan('SCAN TABLE posts_post'))
+        self.assertTrue(benchmark.is_full_scan('SCAN posts_group'))
+        self.assertFalse(benchmark.is_full_scan(
+            'SCAN posts_post USING INDEX posts_post_pub_dat_efcc38_idx'))
+        self.assertFalse(benchmark.is_full_scan(
+            'SEARCH posts_post USING INDEX posts_post_author__7827da_idx '
+            '(author_id=?)'))
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **params):
+        return SQLiteCache(self.path, params)
+
+    def test_shared_between_instances(self):
+        """Запись одного «воркера» видна другому."""
+        other_worker = self.make_cache()
+        self.cache.set_many({'a': 1, 'b': [2]})
+        self.assertEqual(other_worker.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': [2]})
+        other_worker.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_expiry_and_add(self):
+        self.cache.set('key', 'old', timeout=0.05)
+        self.assertFalse(self.cache.add('key', 'new'))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_incr(self):
+        self.cache.set('counter', 1)
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_tables_are_separate(self):
+        pages = self.make_cache(OPTIONS={'TABLE': 'pages'})
+        self.cache.set('key', 'default')
+        pages.clear()
+        self.assertEqual(self.cache.get('key'), 'default')
+
+    def test_cull(self):
+        cache = self.make_cache(OPTIONS={'MAX_ENTRIES': 10,
+                                         'CULL_FREQUENCY': 2})
+        for number in range(20):
+            cache.set(number, number)
+        self.assertLessEqual(len(cache.get_many(range(20))), 11)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = get_user_model().objects.create_user(
+            username='admin', is_staff=True)
+        Post.objects.create(author=cls.user, text='пост')
+
+    def setUp(self):
+        view_stats.clear()
+        for cache in caches.all():
+            cache.clear()
+        self.client = Client()
+
+    @override_settings(PROFILING_SLOW_MS=0)
+    def test_slow_request_logged(self):
+        with self.assertLogs('yatube.slow_requests') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertGreater(record['queries'], 0)
+        self.assertGreater(record['template_ms'], 0)
+        self.assertGreater(record['bytes'], 0)
+        self.assertIsInstance(record['duplicates'], list)
+
+    def test_stats_endpoint_for_staff_only(self):
+        url = reverse('profiling')
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.user)
+        response = self.client.get(url)
+        stats = json.loads(response.content)['views']['posts:index']
+        self.assertEqual(stats['requests'], 2)
+        self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+        self.assertIn('Server-Timing', response)
+        self.assertIn('miss', json.loads(response.content)['cache'])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Реплика в тестах — зеркало основной базы (TEST MIRROR).
+
+    Без общей транзакции: иначе зеркало не видит данных теста, а роутер
+    внутри транзакции читает основную базу.
+    """
+
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.user = get_user_model().objects.create_user(username='writer')
+        self.client = Client()
+        self.client.force_login(self.user)
+        db._lags.clear()
+
+    def replica_queries(self, url, client=None):
+        with CaptureQueriesContext(connections['replica']) as queries:
+            response = (client or self.client).get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_read_only_views_use_replica(self):
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:profile', args=[self.user.username]),
+            reverse('api:post_list'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertGreater(self.replica_queries(url, Client()), 0)
+        with CaptureQueriesContext(connections['replica']) as queries:
+            self.client.post(reverse('posts:post_create'), {'text': 'новый'})
+        self.assertEqual(len(queries), 0)
+
+    def test_reads_pinned_after_write(self):
+        """После записи пользователь читает основную базу."""
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'свежий'})
+        self.assertIn(db.PIN_COOKIE, response.cookies)
+        self.assertEqual(
+            self.replica_queries(reverse('posts:index')), 0)
+        self.client.cookies.pop(db.PIN_COOKIE)
+        caches['pages'].clear()
+        self.assertGreater(
+            self.replica_queries(reverse('posts:index')), 0)
+
+    def test_cached_pages_skip_lagging_replica(self):
+        """Отставшая реплика не попадает в кеш страниц под новой версией."""
+        db._lags['replica'] = (time.monotonic() + 60, 5)
+        self.assertEqual(
+            self.replica_queries(reverse('posts:index'), Client()), 0)
+        self.assertGreater(
+            self.replica_queries(reverse('api:post_list'), Client()), 0)
+
+    def test_write_of_replica_object_goes_to_primary(self):
+        post = Post.objects.using('replica').create(
+            author=self.user, text='пост')
+        self.assertEqual(
+            db.ReplicaRouter().db_for_write(Post, instance=post), 'default')
+
+
+class ReplicaChoiceTests(SimpleTestCase):
+    def setUp(self):
+        # отставание задано заранее и не перемеряется в течение теста
+        now = time.monotonic()
+        db._lags.clear()
+        db._lags.update(
+            {'fast': (now, 0.5), 'slow': (now, 10), 'stale': (now, 100)})
+
+    def tearDown(self):
+        db._lags.clear()
+
+    @override_settings(DATABASE_REPLICAS=['fast', 'slow', 'stale'],
+                       REPLICA_SELECTION='round_robin')
+    def test_round_robin_skips_stale(self):
+        chosen = {db.choose_replica() for _ in range(4)}
+        self.assertEqual(chosen, {'fast', 'slow'})
+
+    @override_settings(DATABASE_REPLICAS=['fast', 'slow', 'stale'],
+                       REPLICA_SELECTION='least_lag')
+    def test_least_lag(self):
+        chosen = {db.choose_replica() for _ in range(4)}
+        self.assertEqual(chosen, {'fast'})
+
+    @override_settings(DATABASE_REPLICAS=['stale'])
+    def test_primary_when_all_stale(self):
+        self.assertIsNone(db.choose_replica())
+
+    def test_lag_counts_wal_writes(self):
+        """В режиме WAL запись меняет `-wal`, а не сам файл базы."""
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        primary = os.path.join(folder, 'primary.sqlite3')
+        replica = os.path.join(folder, 'replica.sqlite3')
+        writer = sqlite3.connect(primary)
+        self.addCleanup(writer.close)
+        writer.execute('PRAGMA journal_mode=WAL')
+        writer.execute('CREATE TABLE t (x)')
+        writer.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        copy = sqlite3.connect(replica)
+        writer.backup(copy)
+        copy.close()
+        past = time.time() - 100
+        for name in (primary, replica):
+            os.utime(name, (past, past))
+        writer.execute('INSERT INTO t VALUES (1)')
+        writer.commit()
+        self.assertEqual(os.path.getmtime(primary), past)
+        # запись вскоре после копии: отставание всё равно растёт со временем
+        os.utime(f'{primary}-wal', (past + 0.5, past + 0.5))
+        with mock.patch.dict(connections['default'].settings_dict,
+                             NAME=primary), \
+                mock.patch.dict(connections['replica'].settings_dict,
+                                NAME=replica):
+            self.assertGreater(db.replica_lag('replica'), 50)
+            db._lags.clear()
+            os.utime(replica, None)
+            self.assertEqual(db.replica_lag('replica'), 0)
+
+
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(cursor.fetchone()[0],
+                             settings.SQLITE_PRAGMAS['cache_size'])
+
+    def test_immediate_transactions_not_locked(self):
+        """С BEGIN IMMEDIATE конкурирующие записи ждут, а не падают."""
+        result = benchmark.write_contention(
+            settings.SQLITE_PRAGMAS, timeout=20, begin='BEGIN IMMEDIATE',
+            writers=4, readers=1, writes=20)
+        self.assertEqual(result['locked'], 0)
+        self.assertEqual(result['committed'], 80)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        singleflight.stats.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'value {self.calls}'
+
+    def fetch(self, key='page'):
+        return singleflight.fetch(
+            self.cache, key, self.compute, 60, latest='latest')
+
+    def lock(self, key):
+        self.cache.add(singleflight.LOCK_KEY.format(key), True)
+
+    def test_computed_once(self):
+        self.assertEqual(self.fetch(), ('value 1', True))
+        self.assertEqual(self.fetch(), ('value 1', True))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(singleflight.stats.snapshot(), {'miss': 1, 'hit': 1})
+
+    def test_previous_value_while_locked(self):
+        self.fetch('old')
+        self.lock('new')
+        self.assertEqual(self.fetch('new'), ('value 1', False))
+        self.assertEqual(self.calls, 1)
+        self.assertIsNone(self.cache.get('new'))
+
+    @override_settings(SINGLE_FLIGHT_WAIT=0.1)
+    def test_waits_then_computes_without_storing(self):
+        self.lock('page')
+        started = time.monotonic()
+        self.assertEqual(self.fetch(), ('value 1', True))
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertIsNone(self.cache.get('page'))
+        self.assertEqual(singleflight.stats.snapshot(), {'timeout': 1})
+
+    @override_settings(CACHE_REFRESH_AHEAD=1)
+    def test_refreshed_ahead_of_expiry(self):
+        self.fetch()
+        self.assertEqual(self.fetch(), ('value 1', True))
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.cache.get('page')[0], 'value 2')
+        self.assertEqual(singleflight.stats.snapshot()['refresh'], 1)
+
+    def test_not_cacheable_value_not_stored(self):
+        singleflight.fetch(
+            self.cache, 'page', self.compute, 60, cacheable=lambda v: False)
+        self.assertIsNone(self.cache.get('page'))
+        self.assertIsNone(
+            self.cache.get(singleflight.LOCK_KEY.format('page')))
@@ -1,7 +1,25 @@
 # core/views.py
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from core import singleflight
+from core.middleware import view_stats
+
+
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию; 
     # выводить её в шаблон пользовательской страницы 404 мы не станем
-    return render(request, 'core/404.html', {'path': request.path}, status=404)
\ No newline at end of file
+    return render(request, 'core/404.html', {'path': request.path}, status=404)
+
+
+@staff_member_required
+def profiling_stats(request):
+    """Перцентили времени по каждому view и счётчики кеша страниц."""
+    return JsonResponse(
+        {
+            'views': view_stats.snapshot(),
+            'cache': singleflight.stats.snapshot(),
+        },
+        json_dumps_params={'ensure_ascii': False, 'indent': 2},
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Post, Group, Follow
 
 
@@ -16,6 +17,14 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # поиск по индексу вместо LIKE '%...%' по всей таблице
+        terms = search.terms(search_term)
+        if not terms:
+            return super().get_search_results(
+                request, queryset, search_term)
+        return search.get_backend().filter_posts(queryset, terms), False
+
 
 # При регистрации модели Post источником конфигурации для неё назначаем
 # класс PostAdmin
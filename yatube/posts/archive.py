@@ -0,0 +1,375 @@
+"""Выгрузка и загрузка постов, комментариев и подписок архивом.
+
+JSON Lines — по записи на строку, тип записи в поле `type`; в одном файле
+могут идти посты, комментарии и подписки (посты раньше комментариев к
+ним, как их и выгружает `export_posts`). CSV — записи одного типа,
+первая строка — имена полей из `FIELDS`.
+
+Авторы и группы указываются по `username` и `slug`, комментарии ссылаются
+на `id` поста. Записи читаются потоком и пишутся пачками через
+`bulk_create`, каждая пачка в своей транзакции, так что память не растёт
+с размером архива. Записи с уже занятыми `id` пропускаются, поэтому архив
+можно загрузить повторно. `bulk_create` обходит сигналы: версии страниц
+пачки меняются после её транзакции, а счётчики и ленты подписок
+пользователей, чьи посты и подписки добавлены, пересчитываются после
+загрузки.
+"""
+import csv
+import itertools
+import json
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache, counters, feed
+from .models import Comment, Follow, Group, Post, User
+
+FIELDS = {
+    'post': ('id', 'author', 'group', 'text', 'pub_date', 'image'),
+    'comment': ('id', 'post', 'author', 'text', 'created'),
+    'follow': ('user', 'author'),
+}
+
+# поля с датой, которую `auto_now_add` затирает при `bulk_create`
+DATE_FIELDS = {Post: 'pub_date', Comment: 'created'}
+# попыток вставить пачку, если её id заняли параллельные записи
+INSERT_ATTEMPTS = 3
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def _chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _date(value):
+    return value.isoformat() if value else None
+
+
+def export_records(kind, chunk_size=2000):
+    """Записи одного типа в порядке `id`, без загрузки всех в память."""
+    if kind == 'post':
+        posts = Post.objects.select_related('author', 'group').order_by('pk')
+        for post in posts.iterator(chunk_size=chunk_size):
+            yield {
+                'id': post.pk,
+                'author': post.author.username,
+                'group': post.group.slug if post.group else None,
+                'text': post.text,
+                'pub_date': _date(post.pub_date),
+                'image': post.image.name or None,
+            }
+    elif kind == 'comment':
+        comments = Comment.objects.select_related('author').order_by('pk')
+        for comment in comments.iterator(chunk_size=chunk_size):
+            yield {
+                'id': comment.pk,
+                'post': comment.post_id,
+                'author': comment.author.username,
+                'text': comment.text,
+                'created': _date(comment.created),
+            }
+    elif kind == 'follow':
+        follows = Follow.objects.order_by('pk').values_list(
+            'user__username', 'author__username')
+        for user, author in follows.iterator(chunk_size=chunk_size):
+            yield {'user': user, 'author': author}
+    else:
+        raise ArchiveError(f'Неизвестный тип записей: {kind}')
+
+
+def write_jsonl(stream, kinds):
+    count = 0
+    for kind in kinds:
+        for record in export_records(kind):
+            stream.write(json.dumps(
+                {'type': kind, **record}, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+def write_csv(stream, kind):
+    writer = csv.DictWriter(stream, fieldnames=FIELDS[kind])
+    writer.writeheader()
+    count = 0
+    for count, record in enumerate(export_records(kind), 1):
+        writer.writerow(record)
+    return count
+
+
+def read_jsonl(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            raise ArchiveError(f'Строка {number}: {error}')
+        if not isinstance(record, dict) or record.get('type') not in FIELDS:
+            raise ArchiveError(f'Строка {number}: нет типа записи')
+        yield record
+
+
+def read_csv(stream, kind):
+    if kind not in FIELDS:
+        raise ArchiveError(f'Неизвестный тип записей: {kind}')
+    for record in csv.DictReader(stream):
+        # пустая ячейка CSV — отсутствующее значение
+        yield {
+            'type': kind,
+            **{key: value or None for key, value in record.items()},
+        }
+
+
+def _parse_int(value, field):
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ArchiveError(f'Неверное значение {field}: {value}')
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    date = parse_datetime(value)
+    if date is None:
+        raise ArchiveError(f'Неверная дата: {value}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date, timezone.utc)
+    return date
+
+
+class Importer:
+    """Загружает записи архива пачками по `batch_size`."""
+
+    def __init__(self, batch_size=1000, create_missing=False):
+        self.batch_size = batch_size
+        self.create_missing = create_missing
+        self.users = {}
+        self.groups = {}
+        self.stats = {'post': 0, 'comment': 0, 'follow': 0, 'skipped': 0}
+        self.touched_scopes = set()
+        # авторы новых постов и подписок и новые подписчики
+        self.authors = set()
+        self.followers = set()
+
+    def load(self, records):
+        records = iter(records)
+        while True:
+            batch = list(itertools.islice(records, self.batch_size))
+            if not batch:
+                break
+            with transaction.atomic():
+                self.load_batch(batch)
+            # ленты пачки сбрасываются сразу, чтобы не копить их до конца
+            cache.bump_members(*self.touched_scopes)
+        self.finish()
+        return self.stats
+
+    def load_batch(self, batch):
+        self.touched_scopes = set()
+        by_kind = {kind: [] for kind in FIELDS}
+        for record in batch:
+            by_kind[record['type']].append(record)
+        self.resolve(batch)
+        self.create_posts(by_kind['post'])
+        self.create_comments(by_kind['comment'])
+        self.create_follows(by_kind['follow'])
+
+    def resolve(self, batch):
+        """Дополняет карты username → id и slug → id одним запросом."""
+        usernames = {
+            record[key] for record in batch
+            for key in ('author', 'user') if record.get(key)
+        } - self.users.keys()
+        slugs = {
+            record['group'] for record in batch if record.get('group')
+        } - self.groups.keys()
+        self.users.update(User.objects.filter(
+            username__in=usernames).values_list('username', 'pk'))
+        self.groups.update(Group.objects.filter(
+            slug__in=slugs).values_list('slug', 'pk'))
+        if not self.create_missing:
+            return
+        password = make_password(None)
+        User.objects.bulk_create([
+            User(username=username, password=password)
+            for username in usernames - self.users.keys()
+        ])
+        Group.objects.bulk_create([
+            Group(title=slug, slug=slug, description='')
+            for slug in slugs - self.groups.keys()
+        ])
+        self.users.update(User.objects.filter(
+            username__in=usernames).values_list('username', 'pk'))
+        self.groups.update(Group.objects.filter(
+            slug__in=slugs).values_list('slug', 'pk'))
+
+    def skip(self):
+        self.stats['skipped'] += 1
+
+    def create_posts(self, records):
+        posts = []
+        for record in records:
+            author_id = self.users.get(record.get('author'))
+            group_slug = record.get('group')
+            if author_id is None or (
+                    group_slug and group_slug not in self.groups):
+                self.skip()
+                continue
+            posts.append(Post(
+                pk=_parse_int(record.get('id'), 'id'),
+                author_id=author_id,
+                group_id=self.groups.get(group_slug),
+                text=record.get('text') or '',
+                pub_date=_parse_date(record.get('pub_date')),
+                image=record.get('image') or '',
+            ))
+            self.touched_scopes.add(cache.author_scope(record['author']))
+            if group_slug:
+                self.touched_scopes.add(cache.group_scope(group_slug))
+        posts = self.insert(Post, posts)
+        self.stats['post'] += len(posts)
+        self.authors.update(post.author_id for post in posts)
+
+    def create_comments(self, records):
+        for record in records:
+            record['post'] = _parse_int(record.get('post'), 'post')
+        post_ids = set(Post.objects.filter(
+            pk__in={record['post'] for record in records}
+        ).values_list('pk', flat=True))
+        comments = []
+        for record in records:
+            author_id = self.users.get(record.get('author'))
+            post_id = record['post']
+            if author_id is None or post_id not in post_ids:
+                self.skip()
+                continue
+            comments.append(Comment(
+                pk=_parse_int(record.get('id'), 'id'),
+                post_id=post_id,
+                author_id=author_id,
+                text=record.get('text') or '',
+                created=_parse_date(record.get('created')),
+            ))
+            self.touched_scopes.add(cache.post_scope(post_id))
+        comments = self.insert(Comment, comments)
+        self.stats['comment'] += len(comments)
+        # счётчик виден на странице поста, которая сбрасывается уже сейчас
+        by_delta = {}
+        for post_id, delta in Counter(
+                comment.post_id for comment in comments).items():
+            by_delta.setdefault(delta, []).append(post_id)
+        for delta, post_ids in by_delta.items():
+            counters.change_comments_many(post_ids, delta)
+
+    def create_follows(self, records):
+        follows = []
+        for record in records:
+            user_id = self.users.get(record.get('user'))
+            author_id = self.users.get(record.get('author'))
+            if user_id is None or author_id is None or user_id == author_id:
+                self.skip()
+                continue
+            follows.append(Follow(user_id=user_id, author_id=author_id))
+        pairs = {(follow.user_id, follow.author_id) for follow in follows}
+        existing = Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id')
+        before = set(existing) & pairs
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        created = set(existing.all()) & pairs - before
+        self.stats['follow'] += len(created)
+        self.stats['skipped'] += len(follows) - len(created)
+        self.authors.update(author_id for _, author_id in created)
+        self.followers.update(user_id for user_id, _ in created)
+
+    def insert(self, model, objects):
+        """`bulk_create` с сохранением дат из архива; возвращает вставленные.
+
+        `auto_now_add` затирает дату при вставке, а без id её нечем потом
+        поправить: SQLite не возвращает id из `bulk_create`. Поэтому id
+        назначаются заранее, а даты восстанавливаются `bulk_update`.
+        Объекты с уже занятыми id пропускаются; если id заняла
+        параллельная запись, пачка вставляется заново.
+        """
+        if not objects:
+            return []
+        date_field = DATE_FIELDS[model]
+        dates = [getattr(obj, date_field) for obj in objects]
+        explicit = [obj.pk for obj in objects]
+        for attempt in range(INSERT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    inserted = self._insert(model, objects, explicit)
+            except IntegrityError:
+                for obj, pk in zip(objects, explicit):
+                    obj.pk = pk
+                continue
+            self.stats['skipped'] += len(objects) - len(inserted)
+            kept = {id(obj) for obj in inserted}
+            dated = []
+            for obj, date in zip(objects, dates):
+                if date is not None and id(obj) in kept:
+                    setattr(obj, date_field, date)
+                    dated.append(obj)
+            model.objects.bulk_update(dated, [date_field])
+            return inserted
+        raise ArchiveError(
+            f'Не удалось вставить пачку {model._meta.verbose_name_plural}')
+
+    def _insert(self, model, objects, explicit):
+        taken = set(model.objects.filter(
+            pk__in={pk for pk in explicit if pk is not None}
+        ).values_list('pk', flat=True))
+        fresh = []
+        for obj, pk in zip(objects, explicit):
+            if pk is None or pk not in taken:
+                taken.add(pk)
+                fresh.append(obj)
+        last = model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        last = max([last, *(obj.pk for obj in fresh if obj.pk)])
+        for obj in fresh:
+            if obj.pk is None:
+                last += 1
+                obj.pk = last
+        model.objects.bulk_create(fresh)
+        return fresh
+
+    def finish(self):
+        """То, что при обычном сохранении делают сигналы."""
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+        # счётчики и ленты только тех, кого коснулась загрузка
+        changed = self.authors | self.followers
+        for chunk in _chunks(changed, self.batch_size):
+            counters.recount(chunk)
+        for chunk in _chunks(self.authors, self.batch_size):
+            feed.rebuild_feeds(author_ids=chunk)
+            followers = Follow.objects.filter(
+                author_id__in=chunk
+            ).order_by().values_list('user_id', flat=True).distinct()
+            cache.bump_members(
+                *(cache.feed_scope(user_id) for user_id in followers))
+        # счётчики видны в профилях
+        cache.bump_members(cache.index_scope(), *(
+            cache.author_scope(username)
+            for username, user_id in self.users.items() if user_id in changed
+        ))
@@ -0,0 +1,254 @@
+"""Кеш страниц лент с версиями вместо короткого TTL.
+
+У каждой ленты (главная, группа, автор, пост) есть версия — метка времени
+последнего изменения её содержимого. Версии входят в ключ кеша страницы,
+поэтому сохранение или удаление поста, группы или комментария сразу
+«переключает» ключ и старая страница больше не отдаётся, а сам кеш может
+жить долго.
+
+Из тех же версий строятся валидаторы HTTP (`ETag`, `Last-Modified`):
+повторный запрос браузера или CDN получает `304 Not Modified` без
+обращения к базе за постами и без рендеринга шаблона.
+
+Страница в кеше одна на всех пользователей: то, что зависит от
+пользователя (шапка, кнопки подписки и редактирования, форма
+комментария), вырезано из неё «дырками» (см. core.holes) и дорисовывается
+к каждому ответу. Гостям готовая страница кешируется целиком, если в ней
+нет CSRF-токена.
+
+Общую заготовку после смены версии пересчитывает один воркер, остальные
+на это время получают предыдущую версию страницы (см. core.singleflight).
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers,
+)
+from django.utils.http import http_date, quote_etag
+
+from core import db, holes, singleflight
+
+VERSION_KEY = 'feed-version:{}'
+PAGE_KEY = 'feed-page:{}'
+
+
+def page_cache():
+    return caches[settings.FEED_CACHE_ALIAS]
+
+
+def index_scope():
+    return 'index'
+
+
+def group_scope(slug):
+    return f'group:{slug}'
+
+
+def author_scope(username):
+    return f'author:{username}'
+
+
+def post_scope(post_id):
+    return f'post:{post_id}'
+
+
+def feed_scope(user_id):
+    """Лента подписок пользователя."""
+    return f'feed:{user_id}'
+
+
+def card_cache():
+    """Кеш карточек постов; версии `*_cards_scope` хранятся в нём же."""
+    return caches['default']
+
+
+def user_cards_scope(user_id):
+    """Карточки постов автора: в них его имя и ссылка на профиль."""
+    return f'cards:user:{user_id}'
+
+
+def group_cards_scope(group_id):
+    """Карточки постов группы: в них ссылка на группу."""
+    return f'cards:group:{group_id}'
+
+
+def members_scope(scope):
+    """Состав ленты: какие посты в ней и в каком порядке, без их текста."""
+    return f'members:{scope}'
+
+
+def get_versions(scopes, backend=None):
+    """Версии лент; отсутствующие в кеше заводятся заново.
+
+    `backend` — кеш, где хранятся версии, по умолчанию кеш страниц.
+    """
+    cache = backend or page_cache()
+    keys = [VERSION_KEY.format(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            version = time.time_ns()
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+            versions[key] = version
+    return [versions[key] for key in keys]
+
+
+def get_with_versions(keys, scopes, backend=None):
+    """Значения `keys` и версии лент `scopes` одним `get_many`.
+
+    Возвращает найденные значения и версии; недостающие версии
+    заводятся, как в `get_versions`.
+    """
+    cache = backend or page_cache()
+    version_keys = [VERSION_KEY.format(scope) for scope in scopes]
+    found = cache.get_many([*keys, *version_keys])
+    missing = [
+        scope for scope, key in zip(scopes, version_keys)
+        if key not in found
+    ]
+    created = {}
+    if missing:
+        created = dict(zip(missing, get_versions(missing, cache)))
+    versions = [
+        found[key] if key in found else created[scope]
+        for scope, key in zip(scopes, version_keys)
+    ]
+    return {key: found[key] for key in keys if key in found}, versions
+
+
+def bump(*scopes, backend=None):
+    """Помечает ленты изменёнными."""
+    version = time.time_ns()
+    (backend or page_cache()).set_many(
+        {VERSION_KEY.format(scope): version for scope in scopes if scope},
+        None,
+    )
+
+
+def bump_members(*scopes):
+    """Помечает изменёнными ленты вместе с их составом (см. posts.idlists)."""
+    bump(*scopes, *(members_scope(scope) for scope in scopes if scope))
+
+
+def _user_key(request):
+    return request.user.pk if request.user.is_authenticated else 'anon'
+
+
+def page_key(request, versions, variant='shared'):
+    """Ключ страницы: общей заготовки (`shared`) или готовой для гостей."""
+    raw = '|'.join(
+        [request.get_full_path(), variant] + [str(v) for v in versions]
+    )
+    return PAGE_KEY.format(hashlib.md5(raw.encode()).hexdigest())
+
+
+def page_validators(request, versions):
+    """`ETag` и `Last-Modified` (в секундах) страницы по версиям лент."""
+    raw = '|'.join(
+        [str(_user_key(request)), settings.PAGE_ETAG_SALT]
+        + [str(v) for v in versions]
+    )
+    etag = quote_etag(hashlib.md5(raw.encode()).hexdigest())
+    return etag, max(versions) // 10 ** 9
+
+
+def _set_validators(response, etag, last_modified, fresh=True):
+    if response.status_code != 200:
+        return
+    if not fresh:
+        # прежняя версия страницы под новым ETag навсегда осталась бы
+        # у браузера: все сверки отвечали бы 304
+        patch_cache_control(response, no_store=True)
+        return
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # браузер хранит страницу, но каждый раз сверяется с сервером
+    patch_cache_control(response, no_cache=True)
+
+
+def _versioned(scopes, store, personal=None):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            shared = scopes(request, *args, **kwargs)
+            own = personal(request, *args, **kwargs) if personal else []
+            versions = get_versions(shared + own)
+            etag, last_modified = page_validators(request, versions)
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                fresh = True
+                if store:
+                    response, fresh = _cached_response(
+                        request, versions[:len(shared)], view, args, kwargs)
+                else:
+                    response = view(request, *args, **kwargs)
+                _set_validators(response, etag, last_modified, fresh)
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def _render_skeleton(request, view, args, kwargs):
+    request.punch_holes = True
+    try:
+        with db.cached_reads():
+            return view(request, *args, **kwargs)
+    finally:
+        request.punch_holes = False
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.streaming
+
+
+def _cached_response(request, versions, view, args, kwargs):
+    """Ответ из кеша и `fresh` — соответствует ли он версиям `versions`."""
+    cache = page_cache()
+    guest = not request.user.is_authenticated
+    if guest:
+        guest_key = page_key(request, versions, 'anon')
+        response = cache.get(guest_key)
+        if response is not None:
+            return response, True
+    skeleton, fresh = singleflight.fetch(
+        cache,
+        page_key(request, versions),
+        lambda: _render_skeleton(request, view, args, kwargs),
+        settings.FEED_CACHE_TIMEOUT,
+        latest=page_key(request, [], 'latest'),
+        cacheable=_cacheable,
+    )
+    if skeleton.streaming:
+        return skeleton, fresh
+    response = holes.fill(skeleton, request)
+    # страница с CSRF-токеном годится только тому, кому токен выдан;
+    # прежнюю версию страницы, отданную на время пересчёта, не запоминаем
+    if (guest and fresh and response.status_code == 200
+            and not request.META.get('CSRF_COOKIE_USED')):
+        cache.set(guest_key, response, settings.FEED_CACHE_TIMEOUT)
+    return response, fresh
+
+
+def cached_feed(scopes, personal=None):
+    """Кеширует страницу, пока не изменилась ни одна из лент `scopes`.
+
+    `scopes` — функция от аргументов view, возвращающая список лент.
+    Страница отдаётся с `ETag`/`Last-Modified` и отвечает 304, если
+    у клиента она уже есть. `personal` — ленты, от которых зависят только
+    «дырки» страницы: они входят в `ETag`, но не в ключ общей заготовки.
+    """
+    return _versioned(scopes, store=True, personal=personal)
+
+
+def conditional_feed(scopes):
+    """Только `ETag`/`Last-Modified` и 304 по версиям лент, без кеша."""
+    return _versioned(scopes, store=False)
@@ -0,0 +1,92 @@
+"""Денормализованные счётчики постов, комментариев и подписок.
+
+Счётчики меняются атомарными `UPDATE ... SET x = x + 1` в тех же
+транзакциях, что создают и удаляют посты, комментарии и подписки, поэтому
+страницы читают их вместе с автором или постом без COUNT(*). Массовые
+загрузки в обход сигналов и любые расхождения чинит `recount()`
+(команда `manage.py recount`).
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Comment, Follow, Post, User, UserStats
+
+USER_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _shift(queryset, field, delta):
+    # счётчик не уходит в минус, даже если уже разошёлся с данными
+    return queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def change_user(user_id, field, delta):
+    """Сдвигает счётчик пользователя, заводя строку счётчиков при нужде.
+
+    Строка заводится только при росте счётчика: уменьшать нечего, а при
+    каскадном удалении пользователя новая строка ссылалась бы на
+    удаляемого пользователя.
+    """
+    stats = UserStats.objects.filter(pk=user_id)
+    if not _shift(stats, field, delta) and delta > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        _shift(stats, field, delta)
+
+
+def change_users(user_ids, field, delta):
+    """Сдвигает счётчик сразу у нескольких пользователей."""
+    if not user_ids or not delta:
+        return
+    if delta > 0:
+        UserStats.objects.bulk_create(
+            [UserStats(user_id=user_id) for user_id in user_ids],
+            ignore_conflicts=True,
+        )
+    _shift(UserStats.objects.filter(pk__in=user_ids), field, delta)
+
+
+def change_comments(post_id, delta):
+    _shift(Post.objects.filter(pk=post_id), 'comments_count', delta)
+
+
+def change_comments_many(post_ids, delta):
+    if post_ids and delta:
+        _shift(Post.objects.filter(pk__in=post_ids), 'comments_count', delta)
+
+
+def _count(queryset, group_by):
+    """Подзапрос COUNT(*) по `queryset` для UPDATE."""
+    counts = (
+        queryset.order_by()
+        .values(group_by)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+@transaction.atomic
+def recount(user_ids=None):
+    """Пересчитывает счётчики по данным; возвращает число строк.
+
+    С `user_ids` — только счётчики этих пользователей, без постов.
+    """
+    users, stats = User.objects.all(), UserStats.objects.all()
+    if user_ids is not None:
+        users = users.filter(pk__in=user_ids)
+        stats = stats.filter(pk__in=user_ids)
+    missing = users.filter(stats__isnull=True).values_list('pk', flat=True)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id) for user_id in missing.iterator()])
+    rows = stats.update(**{
+        field: _count(model.objects.filter(**{key: OuterRef('pk')}), key)
+        for field, (model, key) in USER_COUNTERS.items()
+    })
+    if user_ids is None:
+        rows += Post.objects.update(comments_count=_count(
+            Comment.objects.filter(post=OuterRef('pk')), 'post'))
+    return rows
@@ -0,0 +1,225 @@
+"""Лента подписок с раздачей постов при записи (fan-out-on-write).
+
+Новый пост сразу раскладывается в `FeedEntry` каждого подписчика, поэтому
+страница `/follow/` читается одним диапазонным запросом по индексу
+`(user, pub_date)`. Посты авторов, у которых подписчиков больше
+`FEED_FANOUT_MAX_FOLLOWERS`, не раздаются, а подмешиваются при чтении;
+когда после отписок автор возвращается к порогу, посты, опубликованные
+сверх порога, раскладываются в фоне (`schedule_refill`).
+"""
+import itertools
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q
+
+from core.tasks import run_in_background
+
+from . import cache
+from .models import FeedEntry, Follow, Post, UserStats
+
+
+def fanout_limit():
+    return settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def is_heavy_author(author_id):
+    """Слишком много подписчиков для раздачи при записи."""
+    return UserStats.objects.filter(
+        pk=author_id, followers_count__gt=fanout_limit()).exists()
+
+
+def followed_heavy_authors(user):
+    """{id: username} «тяжёлых» авторов, на которых подписан пользователь."""
+    return dict(
+        Follow.objects.filter(
+            user=user,
+            author__stats__followers_count__gt=fanout_limit(),
+        ).values_list('author_id', 'author__username')
+    )
+
+
+def fanout_followers(author_id):
+    """id подписчиков, по лентам которых раздаются посты автора."""
+    if is_heavy_author(author_id):
+        return []
+    return list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+
+
+def fanout_post(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    followers = fanout_followers(post.author_id)
+    if not followers:
+        return
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date,
+            )
+            for user_id in followers
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def create_entries(entries, batch_size=None):
+    """Вставляет `FeedEntry` из итератора пачками по `FEED_BATCH_SIZE`.
+
+    В памяти одновременно держится не больше одной пачки; возвращает
+    число переданных записей.
+    """
+    batch_size = batch_size or settings.FEED_BATCH_SIZE
+    entries = iter(entries)
+    created = 0
+    while True:
+        batch = list(itertools.islice(entries, batch_size))
+        if not batch:
+            return created
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+        created += len(batch)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту пользователя уже опубликованные посты автора."""
+    backfill_many(user_id, [author_id])
+
+
+def backfill_many(user_id, author_ids):
+    """То же для нескольких авторов одним запросом."""
+    heavy = UserStats.objects.filter(
+        pk__in=author_ids, followers_count__gt=fanout_limit()
+    ).values_list('pk', flat=True)
+    posts = Post.objects.filter(author_id__in=author_ids).exclude(
+        author_id__in=heavy).values_list('pk', 'author_id', 'pub_date')
+    create_entries(
+        FeedEntry(
+            user_id=user_id,
+            post_id=post_id,
+            author_id=author_id,
+            pub_date=pub_date,
+        )
+        for post_id, author_id, pub_date in posts.iterator()
+    )
+
+
+def fill_missed_posts(author_id):
+    """Раскладывает посты, опубликованные, пока автор был «тяжёлым».
+
+    Такие посты не раздавались никому, поэтому у них нет ни одной записи
+    ленты; посты, уже разложенные раньше, не трогаются.
+    """
+    followers = list(
+        Follow.objects.filter(author_id=author_id)
+        .values_list('user_id', flat=True)
+    )
+    posts = Post.objects.filter(author_id=author_id).annotate(
+        fanned=Exists(FeedEntry.objects.filter(post=OuterRef('pk')))
+    ).filter(fanned=False).values_list('pk', 'pub_date')
+    created = create_entries(
+        FeedEntry(user_id=user_id, post_id=post_id,
+                  author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in posts.iterator()
+        for user_id in followers
+    )
+    if created:
+        cache.bump_members(
+            *(cache.feed_scope(user_id) for user_id in followers))
+    return created
+
+
+def refill_light_authors(author_ids):
+    """Раскладывает пропущенные посты авторов, опустившихся до порога.
+
+    Пока автор был «тяжёлым», его новые посты не раздавались; теперь
+    лента читается без подмешивания, и без них эти посты бы пропали.
+    """
+    light = UserStats.objects.filter(
+        pk__in=author_ids, followers_count=fanout_limit()
+    ).values_list('pk', flat=True)
+    for author_id in light:
+        fill_missed_posts(author_id)
+
+
+def schedule_refill(author_ids):
+    """После коммита отписок проверяет авторов в фоне (core.tasks)."""
+    author_ids = list(author_ids)
+    if author_ids:
+        transaction.on_commit(
+            lambda: run_in_background(refill_light_authors, author_ids))
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    prune_many(user_id, [author_id])
+
+
+def prune_many(user_id, author_ids):
+    still_followed = Follow.objects.filter(user_id=user_id).values(
+        'author_id')
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).exclude(author_id__in=still_followed).delete()
+
+
+def follow_feed(user, heavy=None):
+    """Посты ленты подписок пользователя.
+
+    `heavy` — уже полученный `followed_heavy_authors(user)`.
+    """
+    if heavy is None:
+        heavy = followed_heavy_authors(user)
+    if not heavy:
+        return Post.objects.for_feed().filter(
+            feed_entries__user=user
+        ).order_by(
+            '-feed_entries__pub_date'
+        )
+    entries = FeedEntry.objects.filter(user=user).values('post_id')
+    return Post.objects.for_feed().filter(
+        Q(pk__in=entries) | Q(author_id__in=heavy)
+    )
+
+
+def rebuild_feeds(batch_size=None, author_ids=None):
+    """Заново раскладывает посты по лентам всех подписчиков.
+
+    Нужна после массовой загрузки через `bulk_create`, которая обходит
+    сигналы; `author_ids` ограничивает её постами этих авторов.
+    Возвращает число обработанных записей.
+    """
+    follows = Follow.objects.all()
+    if author_ids is not None:
+        follows = follows.filter(author_id__in=author_ids)
+    heavy = (
+        follows.values('author_id')
+        .annotate(followers=Count('user_id', distinct=True))
+        .filter(followers__gt=fanout_limit())
+        .values_list('author_id', flat=True)
+    )
+    authors = list(
+        follows.exclude(author_id__in=heavy)
+        .values_list('author_id', flat=True)
+        .distinct()
+    )
+
+    def entries():
+        for author_id in authors:
+            followers = list(
+                Follow.objects.filter(author_id=author_id)
+                .values_list('user_id', flat=True)
+                .distinct()
+            )
+            posts = Post.objects.filter(author_id=author_id).values_list(
+                'pk', 'pub_date')
+            for post_id, pub_date in posts.iterator():
+                for user_id in followers:
+                    yield FeedEntry(user_id=user_id, post_id=post_id,
+                                    author_id=author_id, pub_date=pub_date)
+
+    return create_entries(entries(), batch_size)
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from posts import uploads
 from posts.models import Post, Comment
 
 
@@ -7,6 +10,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('text', 'group', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # уже сохранённую картинку при правке поста не трогаем
+        if isinstance(image, UploadedFile):
+            image = uploads.normalize(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
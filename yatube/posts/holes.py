@@ -0,0 +1,46 @@
+"""Фрагменты страниц постов, свои у каждого пользователя (см. core.holes)."""
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.utils.html import format_html
+
+from core import holes
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@holes.register('switcher')
+def switcher(request):
+    return render_to_string(
+        'posts/includes/switcher.html', request=request)
+
+
+@holes.register('follow_button')
+def follow_button(request, author_id, username):
+    user = request.user
+    following = user.is_authenticated and Follow.objects.filter(
+        user=user, author_id=author_id).exists()
+    return render_to_string('includes/follow_button.html', {
+        'following': following,
+        'username': username,
+    })
+
+
+@holes.register('post_actions')
+def post_actions(request, post_id, author_id):
+    if request.user.pk != author_id:
+        return ''
+    return format_html(
+        '<a class="btn btn-primary" href="{}">редактировать запись</a>',
+        reverse('posts:post_edit', args=[post_id]),
+    )
+
+
+@holes.register('comment_form')
+def comment_form(request, post_id):
+    if not request.user.is_authenticated:
+        return ''
+    return render_to_string('includes/comment_form.html', {
+        'form': CommentForm(),
+        'post_id': post_id,
+    }, request=request)
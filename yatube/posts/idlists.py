@@ -0,0 +1,94 @@
+"""Кеш состава страниц лент: списки id постов и сами посты по отдельности.
+
+Для страницы ленты в кеше лежит только упорядоченный список id постов и
+число постов в ленте. Ключи строятся по версиям состава лент
+(`cache.members_scope`), которые меняются, когда пост появляется в ленте
+или уходит из неё, но не при правке текста. Посты достаются одним
+`get_many` по ключам `post:<id>`, недостающие — одним запросом
+`pk__in`; правка поста удаляет только его ключ (`forget`), правка автора
+или группы — ключи их постов, загруженных вместе с ними.
+
+Промах по странице обходится одним запросом, как и без кеша: посты
+страницы выбираются целиком, и по ним запоминается список id.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+from . import cache
+
+COUNT_KEY = 'feed-count:{}'
+IDS_KEY = 'feed-ids:{}:{}:{}'
+POST_KEY = 'post:{}'
+
+
+def forget(*post_ids):
+    cache.page_cache().delete_many(
+        [POST_KEY.format(post_id) for post_id in post_ids])
+
+
+def remember(posts):
+    cache.page_cache().set_many(
+        {POST_KEY.format(post.pk): post for post in posts},
+        settings.FEED_CACHE_TIMEOUT,
+    )
+
+
+def hydrate(ids, queryset):
+    """Посты с `ids` в том же порядке: из кеша, остальные из `queryset`."""
+    keys = {post_id: POST_KEY.format(post_id) for post_id in ids}
+    cached = cache.page_cache().get_many(keys.values())
+    posts = {
+        post_id: cached[key] for post_id, key in keys.items()
+        if key in cached
+    }
+    missing = [post_id for post_id in ids if post_id not in posts]
+    if missing:
+        fetched = list(queryset.order_by().filter(pk__in=missing))
+        remember(fetched)
+        posts.update((post.pk, post) for post in fetched)
+    # удалённый за это время пост просто пропускаем
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+class FeedPaginator(Paginator):
+    """Paginator, который берёт число постов и id страницы из кеша.
+
+    `scopes` — ленты, от состава которых зависит `object_list`.
+    """
+
+    def __init__(self, object_list, per_page, scopes, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        members = [cache.members_scope(scope) for scope in scopes]
+        raw = '|'.join(
+            list(scopes) + [str(v) for v in cache.get_versions(members)])
+        self.prefix = hashlib.md5(raw.encode()).hexdigest()
+
+    @cached_property
+    def count(self):
+        key = COUNT_KEY.format(self.prefix)
+        count = cache.page_cache().get(key)
+        if count is None:
+            count = self.object_list.count()
+            cache.page_cache().set(key, count, settings.FEED_CACHE_TIMEOUT)
+        return count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        key = IDS_KEY.format(self.prefix, bottom, top)
+        ids = cache.page_cache().get(key)
+        if ids is None:
+            posts = list(self.object_list[bottom:top])
+            remember(posts)
+            cache.page_cache().set(
+                key, [post.pk for post in posts],
+                settings.FEED_CACHE_TIMEOUT)
+        else:
+            posts = hydrate(ids, self.object_list)
+        return self._get_page(posts, number, self)
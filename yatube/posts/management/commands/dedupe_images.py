@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.storage import adopt
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов, загруженные до хранилища по хешу, под '
+        'имена по содержимому; одинаковые файлы остаются в одном экземпляре'
+    )
+
+    def handle(self, *args, **options):
+        names = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct()
+        moved = 0
+        for name in list(names.iterator()):
+            if adopt(name) != name:
+                moved += 1
+        self.stdout.write(self.style.SUCCESS(f'Перенесено файлов: {moved}'))
@@ -0,0 +1,45 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = 'Выгружает посты, комментарии и подписки в JSON Lines или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Файл архива, «-» — стандартный вывод',
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'), default='jsonl')
+        parser.add_argument(
+            '--type', dest='kinds', action='append',
+            choices=tuple(archive.FIELDS),
+            help='Какие записи выгружать (для CSV — ровно один тип)',
+        )
+
+    def handle(self, *args, **options):
+        kinds = options['kinds'] or list(archive.FIELDS)
+        if options['format'] == 'csv' and len(kinds) != 1:
+            raise CommandError('В CSV выгружаются записи одного типа, '
+                               'укажите --type')
+        start = time.perf_counter()
+        if options['path'] == '-':
+            count = self.export(sys.stdout, kinds, options['format'])
+        else:
+            with open(options['path'], 'w', encoding='utf-8',
+                      newline='') as stream:
+                count = self.export(stream, kinds, options['format'])
+        elapsed = time.perf_counter() - start
+        self.stderr.write(
+            f'Выгружено записей: {count} за {elapsed:.1f} с '
+            f'({count / max(elapsed, 1e-6):.0f} строк/с)')
+
+    def export(self, stream, kinds, file_format):
+        if file_format == 'csv':
+            return archive.write_csv(stream, kinds[0])
+        return archive.write_jsonl(stream, kinds)
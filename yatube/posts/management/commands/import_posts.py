@@ -0,0 +1,63 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает посты, комментарии и подписки из JSON Lines или CSV '
+        'пачками через bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл архива, «-» — стандартный ввод')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='По умолчанию по расширению файла, иначе jsonl',
+        )
+        parser.add_argument(
+            '--type', dest='kind', choices=tuple(archive.FIELDS),
+            default='post', help='Тип записей в CSV',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--create-missing', action='store_true',
+            help='Заводить неизвестных авторов и группы',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'jsonl')
+        importer = archive.Importer(
+            batch_size=options['batch_size'],
+            create_missing=options['create_missing'],
+        )
+        start = time.perf_counter()
+        try:
+            if path == '-':
+                stats = self.load(importer, sys.stdin, file_format, options)
+            else:
+                with open(path, encoding='utf-8', newline='') as stream:
+                    stats = self.load(importer, stream, file_format, options)
+        except (OSError, archive.ArchiveError) as error:
+            raise CommandError(error)
+        elapsed = time.perf_counter() - start
+        rows = sum(stats.values())
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: постов {post}, комментариев {comment}, '
+            'подписок {follow}; пропущено {skipped}'.format(**stats)))
+        self.stdout.write(
+            f'{rows} строк за {elapsed:.1f} с '
+            f'({rows / max(elapsed, 1e-6):.0f} строк/с)')
+
+    def load(self, importer, stream, file_format, options):
+        if file_format == 'csv':
+            records = archive.read_csv(stream, options['kind'])
+        else:
+            records = archive.read_jsonl(stream)
+        return importer.load(records)
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает поисковый индекс постов и комментариев'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        rows = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'{type(backend).__name__}: проиндексировано строк: {rows}'))
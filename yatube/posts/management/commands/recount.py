@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счётчики постов, комментариев и подписок по данным '
+        'в базе'
+    )
+
+    def handle(self, *args, **options):
+        rows = recount()
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано строк: {rows}'))
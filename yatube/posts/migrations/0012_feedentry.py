@@ -0,0 +1,82 @@
+# Generated by Django 2.2.16 on 2026-10-17 15:19
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """Раскладывает посты по лентам пачками, как `feed.rebuild_feeds`.
+
+    Посты «тяжёлых» авторов не раскладываются: они подмешиваются при
+    чтении.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    heavy = (
+        Follow.objects.values('author_id')
+        .annotate(followers=models.Count('user_id', distinct=True))
+        .filter(followers__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list('author_id', flat=True)
+    )
+    authors = list(
+        Follow.objects.exclude(author_id__in=heavy)
+        .values_list('author_id', flat=True)
+        .distinct()
+    )
+    batch = []
+    for author_id in authors:
+        followers = list(
+            Follow.objects.filter(author_id=author_id)
+            .values_list('user_id', flat=True)
+        )
+        posts = Post.objects.filter(author_id=author_id).values_list(
+            'pk', 'pub_date')
+        for post_id, pub_date in posts.iterator():
+            for user_id in followers:
+                batch.append(FeedEntry(
+                    user_id=user_id, post_id=post_id,
+                    author_id=author_id, pub_date=pub_date))
+                if len(batch) >= settings.FEED_BATCH_SIZE:
+                    FeedEntry.objects.bulk_create(
+                        batch, ignore_conflicts=True)
+                    batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_auto_20220801_1521'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-pub_date'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date'], name='posts_feede_user_id_ec0439_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='posts_feede_user_id_d36d8f_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='feedentry',
+            unique_together={('user', 'post')},
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
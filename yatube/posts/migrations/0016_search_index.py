@@ -0,0 +1,80 @@
+# Generated by Django 2.2.16 on 2026-10-17 15:45
+
+from django.db import migrations
+
+TOKENIZE = "tokenize='unicode61 remove_diacritics 2', prefix='2 3'"
+
+CREATE_SQL = [
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, content='posts_post', content_rowid='id', " + TOKENIZE + ")",
+    "CREATE TRIGGER posts_post_fts_ai AFTER INSERT ON posts_post BEGIN"
+    " INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);"
+    " END",
+    "CREATE TRIGGER posts_post_fts_ad AFTER DELETE ON posts_post BEGIN"
+    " INSERT INTO posts_post_fts(posts_post_fts, rowid, text)"
+    " VALUES ('delete', old.id, old.text);"
+    " END",
+    "CREATE TRIGGER posts_post_fts_au AFTER UPDATE OF text ON posts_post"
+    " BEGIN"
+    " INSERT INTO posts_post_fts(posts_post_fts, rowid, text)"
+    " VALUES ('delete', old.id, old.text);"
+    " INSERT INTO posts_post_fts(rowid, text) VALUES (new.id, new.text);"
+    " END",
+    "CREATE VIRTUAL TABLE posts_comment_fts USING fts5("
+    "text, post_id UNINDEXED, content='posts_comment', content_rowid='id', "
+    + TOKENIZE + ")",
+    "CREATE TRIGGER posts_comment_fts_ai AFTER INSERT ON posts_comment BEGIN"
+    " INSERT INTO posts_comment_fts(rowid, text, post_id)"
+    " VALUES (new.id, new.text, new.post_id);"
+    " END",
+    "CREATE TRIGGER posts_comment_fts_ad AFTER DELETE ON posts_comment BEGIN"
+    " INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text, post_id)"
+    " VALUES ('delete', old.id, old.text, old.post_id);"
+    " END",
+    "CREATE TRIGGER posts_comment_fts_au AFTER UPDATE ON posts_comment BEGIN"
+    " INSERT INTO posts_comment_fts(posts_comment_fts, rowid, text, post_id)"
+    " VALUES ('delete', old.id, old.text, old.post_id);"
+    " INSERT INTO posts_comment_fts(rowid, text, post_id)"
+    " VALUES (new.id, new.text, new.post_id);"
+    " END",
+    "INSERT INTO posts_post_fts(posts_post_fts) VALUES ('rebuild')",
+    "INSERT INTO posts_comment_fts(posts_comment_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_ai',
+    'DROP TRIGGER IF EXISTS posts_post_fts_ad',
+    'DROP TRIGGER IF EXISTS posts_post_fts_au',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_ai',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_ad',
+    'DROP TRIGGER IF EXISTS posts_comment_fts_au',
+    'DROP TABLE IF EXISTS posts_post_fts',
+    'DROP TABLE IF EXISTS posts_comment_fts',
+]
+
+
+def _execute(schema_editor, statements):
+    # индекс FTS5 есть только в SQLite, остальные базы ищут через LIKE
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor, CREATE_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    _execute(schema_editor, DROP_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
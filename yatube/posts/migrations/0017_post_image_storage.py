@@ -0,0 +1,23 @@
+# Generated by Django 2.2.16 on 2026-10-17 15:48
+
+from django.db import migrations, models
+import posts.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_search_index'),
+    ]
+
+    # Хранилище не отражается в схеме. Обычный AlterField на SQLite
+    # пересоздал бы таблицу постов вместе с триггерами поискового индекса.
+    operations = [
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=posts.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+    ]
@@ -0,0 +1,138 @@
+"""Постраничный вывод по курсору (keyset pagination).
+
+В отличие от `django.core.paginator.Paginator` не выполняет `COUNT(*)` и
+не пропускает строки через `OFFSET`: каждая страница выбирается условием
+по паре `(key, id)` относительно границы предыдущей, поэтому стоимость
+не зависит от глубины листания.
+"""
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Список значений из курсора или None, если курсор испорчен."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class CursorPage(Sequence):
+    is_cursor = True
+
+    def __init__(self, object_list, has_next, has_previous,
+                 next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<CursorPage of %d objects>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+
+class CursorPaginator:
+    """Листает queryset по убыванию `(key, pk)`."""
+    forward = 'n'
+    backward = 'p'
+
+    def __init__(self, object_list, per_page, key='pub_date'):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.key = key
+        self.key_field = object_list.model._meta.get_field(key)
+
+    def encode(self, direction, obj):
+        value = getattr(obj, self.key)
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        return encode_cursor([direction, value, obj.pk])
+
+    def decode(self, token):
+        values = decode_cursor(token)
+        if values is None or len(values) != 3:
+            return None
+        direction, value, pk = values
+        if direction not in (self.forward, self.backward):
+            return None
+        try:
+            value = self.key_field.to_python(value)
+        except ValidationError:
+            return None
+        if value is None or not isinstance(pk, int):
+            return None
+        return direction, value, pk
+
+    def get_page(self, cursor=None):
+        """Страница после/до курсора; испорченный курсор — первая."""
+        decoded = self.decode(cursor)
+        key = self.key
+        if decoded is None:
+            return self._page(
+                self.object_list.order_by('-' + key, '-pk'),
+                is_first=True,
+            )
+        direction, value, pk = decoded
+        if direction == self.forward:
+            boundary = Q(**{key + '__lt': value}) | Q(
+                **{key: value, 'pk__lt': pk})
+            return self._page(
+                self.object_list.filter(boundary).order_by('-' + key, '-pk'),
+                is_first=False,
+            )
+        boundary = Q(**{key + '__gt': value}) | Q(
+            **{key: value, 'pk__gt': pk})
+        rows = list(
+            self.object_list.filter(boundary).order_by(key, 'pk')
+            [:self.per_page + 1]
+        )
+        has_previous = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        return self._build(rows, has_next=True, has_previous=has_previous)
+
+    def _page(self, queryset, is_first):
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return self._build(rows[:self.per_page], has_next=has_next,
+                           has_previous=not is_first)
+
+    def _build(self, rows, has_next, has_previous):
+        if not rows:
+            return CursorPage(rows, False, has_previous)
+        return CursorPage(
+            rows,
+            has_next=has_next,
+            has_previous=has_previous,
+            next_cursor=self.encode(self.forward, rows[-1]),
+            previous_cursor=self.encode(self.backward, rows[0]),
+        )
@@ -0,0 +1,195 @@
+"""Полнотекстовый поиск по постам и комментариям к ним.
+
+Бэкенд выбирается настройкой `SEARCH_BACKEND` (путь к классу). По
+умолчанию на SQLite используется инвертированный индекс FTS5: таблицы
+`posts_post_fts` и `posts_comment_fts` создаются миграцией и обновляются
+триггерами базы, так что в синхронизации участвуют и `bulk_create`, и
+правки в обход ORM. На других базах поиск идёт через `LIKE`.
+
+Результаты упорядочены по релевантности `(rank, id)`: чем меньше `rank`,
+тем выше пост; по этой же паре работает курсор.
+"""
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Comment, Post
+from .paginators import CursorPage, decode_cursor, encode_cursor
+
+TOKEN_RE = re.compile(r'\w+')
+
+# больше слов в запросе не учитывается
+MAX_TERMS = 8
+
+# совпадение в комментарии весит меньше совпадения в тексте поста
+COMMENT_WEIGHT = 0.5
+
+
+def terms(query):
+    """Слова запроса в нижнем регистре."""
+    return TOKEN_RE.findall(query.lower())[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Интерфейс бэкенда поиска."""
+
+    def ranked(self, terms, limit, after=None, before=None):
+        """Пары `(rank, post_id)` по возрастанию, после или до границы."""
+        raise NotImplementedError
+
+    def filter_posts(self, queryset, terms):
+        """Посты `queryset`, в тексте которых есть все слова."""
+        raise NotImplementedError
+
+    def rebuild(self):
+        """Перестраивает индекс; возвращает число проиндексированных строк."""
+        return 0
+
+
+class SQLiteFTSBackend(SearchBackend):
+    posts_table = 'posts_post_fts'
+    comments_table = 'posts_comment_fts'
+
+    def match(self, terms):
+        # каждое слово ищется и как префикс: «прог» найдёт «программа»
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def ranked(self, terms, limit, after=None, before=None):
+        posts, comments = self.posts_table, self.comments_table
+        match = self.match(terms)
+        params = [match, COMMENT_WEIGHT, match]
+        sql = (
+            'SELECT rank, post_id FROM ('
+            ' SELECT MIN(rank) AS rank, post_id FROM ('
+            f'  SELECT bm25({posts}) AS rank, rowid AS post_id'
+            f'  FROM {posts} WHERE {posts} MATCH %s'
+            '  UNION ALL'
+            f'  SELECT bm25({comments}) * %s, post_id'
+            f'  FROM {comments} WHERE {comments} MATCH %s'
+            ' ) GROUP BY post_id'
+            ')'
+        )
+        order = 'rank, post_id'
+        if after is not None:
+            sql += ' WHERE rank > %s OR (rank = %s AND post_id > %s)'
+            params += [after[0], after[0], after[1]]
+        elif before is not None:
+            sql += ' WHERE rank < %s OR (rank = %s AND post_id < %s)'
+            params += [before[0], before[0], before[1]]
+            order = 'rank DESC, post_id DESC'
+        sql += f' ORDER BY {order} LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        return rows[::-1] if before is not None else rows
+
+    def filter_posts(self, queryset, terms):
+        table = self.posts_table
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {table} WHERE {table} MATCH %s',
+            [self.match(terms)],
+        ))
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            for table in (self.posts_table, self.comments_table):
+                cursor.execute(
+                    f"INSERT INTO {table}({table}) VALUES('rebuild')")
+        return Post.objects.count() + Comment.objects.count()
+
+    @classmethod
+    def is_available(cls):
+        return (
+            connection.vendor == 'sqlite'
+            and cls.posts_table in connection.introspection.table_names()
+        )
+
+
+class LikeBackend(SearchBackend):
+    """Поиск без индекса через `LIKE`; новые посты выше."""
+
+    def condition(self, terms, fields):
+        condition = Q()
+        for term in terms:
+            term_condition = Q()
+            for field in fields:
+                term_condition |= Q(**{f'{field}__icontains': term})
+            condition &= term_condition
+        return condition
+
+    def ranked(self, terms, limit, after=None, before=None):
+        posts = Post.objects.filter(
+            self.condition(terms, ['text', 'comments__text'])
+        ).distinct()
+        if after is not None:
+            ids = posts.filter(pk__lt=after[1]).order_by('-pk')
+        elif before is not None:
+            ids = posts.filter(pk__gt=before[1]).order_by('pk')
+        else:
+            ids = posts.order_by('-pk')
+        rows = [(-pk, pk) for pk in ids.values_list('pk', flat=True)[:limit]]
+        return rows[::-1] if before is not None else rows
+
+    def filter_posts(self, queryset, terms):
+        return queryset.filter(self.condition(terms, ['text']))
+
+
+_default_backend = None
+
+
+def get_backend():
+    global _default_backend
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    if _default_backend is None:
+        _default_backend = (
+            SQLiteFTSBackend() if SQLiteFTSBackend.is_available()
+            else LikeBackend()
+        )
+    return _default_backend
+
+
+def _decode(cursor):
+    values = decode_cursor(cursor)
+    if values is None or len(values) != 3 or values[0] not in 'np':
+        return None
+    direction, rank, pk = values
+    if not isinstance(rank, (int, float)) or not isinstance(pk, int):
+        return None
+    return direction, (rank, pk)
+
+
+def search_page(query, cursor=None, per_page=10):
+    """Страница найденных постов по курсору `(rank, id)`."""
+    words = terms(query)
+    if not words:
+        return CursorPage([], False, False)
+    decoded = _decode(cursor)
+    bounds = {}
+    if decoded is not None:
+        direction, boundary = decoded
+        bounds['after' if direction == 'n' else 'before'] = boundary
+    rows = get_backend().ranked(words, per_page + 1, **bounds)
+    more = len(rows) > per_page
+    if 'before' in bounds:
+        rows = rows[-per_page:]
+        has_next, has_previous = True, more
+    else:
+        rows = rows[:per_page]
+        has_next, has_previous = more, decoded is not None
+    posts = Post.objects.for_feed().in_bulk([pk for _, pk in rows])
+    found = [posts[pk] for _, pk in rows if pk in posts]
+    if not rows:
+        return CursorPage(found, False, has_previous)
+    return CursorPage(
+        found,
+        has_next=has_next,
+        has_previous=has_previous,
+        next_cursor=encode_cursor(['n', *rows[-1]]),
+        previous_cursor=encode_cursor(['p', *rows[0]]),
+    )
@@ -0,0 +1,158 @@
+"""Пакетные подписки, отписки и комментарии.
+
+Пачка применяется в одной транзакции: новые строки пишутся одним
+`bulk_create`, удаляемые — одним `DELETE ... IN` без сигналов
+(`signals.follow_batch`). Всё, что при одиночном сохранении делают
+сигналы (счётчики, ленты подписок, версии кеша страниц), здесь сделано
+явно и тоже пачками, по подпискам, которые действительно появились или
+исчезли: их показывает сверка до и после записи в той же транзакции.
+Результат — список итогов по каждому элементу в порядке запроса.
+"""
+from django.db import transaction
+
+from . import cache, counters, feed
+from .forms import CommentForm
+from .models import Comment, Follow, Post, User
+from .signals import follow_batch
+
+FOLLOW = 'follow'
+UNFOLLOW = 'unfollow'
+
+
+def _result(status, **extra):
+    return {'status': status, **extra}
+
+
+def _error(message):
+    return _result('error', errors={'__all__': [message]})
+
+
+class _FollowPlan:
+    """Итоговые изменения подписок пользователя по списку операций."""
+
+    def __init__(self, user, authors, existing):
+        self.user = user
+        self.authors = authors
+        self.following = existing
+        self.to_follow = set()
+        self.to_unfollow = set()
+
+    def apply(self, op, username):
+        author_id = self.authors.get(username)
+        if op not in (FOLLOW, UNFOLLOW):
+            return _error(f'Неизвестная операция: {op}')
+        if author_id is None:
+            return _error(f'Нет пользователя {username}')
+        if author_id == self.user.pk:
+            return _error('Нельзя подписаться на себя')
+        if op == FOLLOW:
+            if author_id in self.following:
+                return _result('exists')
+            self.following.add(author_id)
+            # подписка после отписки в той же пачке отменяет отписку
+            if author_id in self.to_unfollow:
+                self.to_unfollow.discard(author_id)
+            else:
+                self.to_follow.add(author_id)
+            return _result('created')
+        if author_id not in self.following:
+            return _result('missing')
+        self.following.discard(author_id)
+        if author_id in self.to_follow:
+            self.to_follow.discard(author_id)
+        else:
+            self.to_unfollow.add(author_id)
+        return _result('deleted')
+
+
+@transaction.atomic
+def apply_follows(user, operations):
+    """Применяет пары `(op, username)`, где op — 'follow' или 'unfollow'."""
+    usernames = {username for _, username in operations}
+    authors = dict(User.objects.filter(
+        username__in=usernames).values_list('username', 'pk'))
+    follows = Follow.objects.filter(
+        user=user, author_id__in=authors.values()
+    ).values_list('author_id', flat=True)
+    before = set(follows)
+    plan = _FollowPlan(user, authors, set(before))
+    results = [plan.apply(op, username) for op, username in operations]
+
+    Follow.objects.bulk_create(
+        [Follow(user=user, author_id=author_id)
+         for author_id in plan.to_follow],
+        ignore_conflicts=True,
+    )
+    if plan.to_unfollow:
+        with follow_batch():
+            Follow.objects.filter(
+                user=user, author_id__in=plan.to_unfollow).delete()
+    after = (set(follows.all()) if plan.to_follow or plan.to_unfollow
+             else before)
+    followed = after - before
+    unfollowed = before - after
+
+    counters.change_users(
+        [user.pk], 'following_count', len(followed) - len(unfollowed))
+    counters.change_users(list(followed), 'followers_count', 1)
+    counters.change_users(list(unfollowed), 'followers_count', -1)
+    feed.backfill_many(user.pk, followed)
+    feed.prune_many(user.pk, unfollowed)
+    feed.schedule_refill(unfollowed)
+
+    changed = followed | unfollowed
+    if changed:
+        usernames = {pk: name for name, pk in authors.items()}
+        cache.bump_members(cache.feed_scope(user.pk))
+        cache.bump(
+            cache.author_scope(user.username),
+            *(cache.author_scope(usernames[pk]) for pk in changed),
+        )
+    return results
+
+
+def _post_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@transaction.atomic
+def add_comments(user, items):
+    """Добавляет комментарии из словарей `{'post': id, 'text': ...}`."""
+    post_ids = {_post_id(item.get('post')) for item in items}
+    existing = set(Post.objects.filter(
+        pk__in=post_ids - {None}).values_list('pk', flat=True))
+    comments = []
+    results = []
+    for item in items:
+        post_id = _post_id(item.get('post'))
+        if post_id not in existing:
+            results.append(_error(f'Нет поста {item.get("post")}'))
+            continue
+        form = CommentForm(data={'text': item.get('text')})
+        if not form.is_valid():
+            results.append(_result(
+                'error', errors={
+                    field: [error['message'] for error in errors]
+                    for field, errors in form.errors.get_json_data().items()
+                }))
+            continue
+        comment = form.save(commit=False)
+        comment.author = user
+        comment.post_id = post_id
+        comments.append(comment)
+        results.append(_result('created'))
+
+    Comment.objects.bulk_create(comments)
+    per_post = {}
+    for comment in comments:
+        per_post[comment.post_id] = per_post.get(comment.post_id, 0) + 1
+    for count in set(per_post.values()):
+        counters.change_comments_many(
+            [post_id for post_id, n in per_post.items() if n == count],
+            count,
+        )
+    cache.bump(*(cache.post_scope(post_id) for post_id in per_post))
+    return results
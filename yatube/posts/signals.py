@@ -0,0 +1,260 @@
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+from django.db import transaction
+from django.db.models.signals import (
+    post_delete, post_init, post_save, pre_delete,
+)
+from django.dispatch import receiver
+
+from . import cache, counters, feed, idlists, storage, thumbnails
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+_follow_batch = contextvars.ContextVar('follow_batch', default=False)
+
+
+@contextmanager
+def follow_batch():
+    """Подписки меняются пачкой, которая сама двигает счётчики и ленты."""
+    token = _follow_batch.set(True)
+    try:
+        yield
+    finally:
+        _follow_batch.reset(token)
+
+
+def _single_follow(handler):
+    @wraps(handler)
+    def wrapper(sender, instance, **kwargs):
+        if not _follow_batch.get():
+            handler(sender, instance, **kwargs)
+    return wrapper
+
+
+def _username(instance):
+    """Имя автора поста или подписки, по возможности без запроса."""
+    if type(instance).author.is_cached(instance):
+        return instance.author.username
+    return User.objects.filter(pk=instance.author_id).values_list(
+        'username', flat=True).first()
+
+
+def post_scopes(post):
+    """Ленты, в которых показывается пост (с учётом прежней группы)."""
+    group_ids = {post.group_id, getattr(post, '_loaded_group_id', None)}
+    group_ids.discard(None)
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True) if group_ids else []
+    return [
+        cache.index_scope(),
+        cache.author_scope(_username(post)),
+        cache.post_scope(post.pk),
+        *(cache.group_scope(slug) for slug in slugs),
+        *(cache.feed_scope(user_id)
+          for user_id in feed.fanout_followers(post.author_id)),
+    ]
+
+
+def shown_pages(posts, comments=None):
+    """id постов `posts` и ленты, где видны они и комментарии `comments`.
+
+    Имя автора и ссылка на группу есть на всех страницах с постом:
+    главной, группы, профиля, самого поста и в лентах подписчиков.
+    """
+    post_ids, scopes = [], {cache.index_scope()}
+    for post_id, username, slug in posts.values_list(
+            'pk', 'author__username', 'group__slug'):
+        post_ids.append(post_id)
+        scopes.update((cache.post_scope(post_id),
+                       cache.author_scope(username)))
+        if slug:
+            scopes.add(cache.group_scope(slug))
+    if comments is not None:
+        scopes.update(cache.post_scope(post_id) for post_id in
+                      comments.values_list('post_id', flat=True).distinct())
+    followers = Follow.objects.filter(
+        author__in=posts.values('author_id')
+    ).values_list('user_id', flat=True).distinct()
+    scopes.update(cache.feed_scope(user_id) for user_id in followers)
+    return post_ids, scopes
+
+
+@receiver(post_init, sender=Post)
+def remember_post_group(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+    instance._loaded_image = str(instance.__dict__.get('image') or '')
+
+
+@receiver(post_init, sender=Group)
+def remember_group_slug(sender, instance, **kwargs):
+    instance._loaded_slug = instance.__dict__.get('slug')
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._loaded_username = instance.__dict__.get('username')
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fanout_new_post(sender, instance, created, **kwargs):
+    if created:
+        feed.fanout_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, **kwargs):
+    previous = instance._loaded_image
+    if previous and previous != (instance.image.name or ''):
+        transaction.on_commit(lambda: storage.release(previous))
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: storage.release(name))
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    if instance.image and instance.image.name != instance._loaded_image:
+        thumbnails.schedule_on_commit(instance.pk)
+    instance._loaded_image = instance.image.name or ''
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, created=None, **kwargs):
+    moved = instance._loaded_group_id != instance.group_id
+    if created is False and not moved:
+        # правка не меняет состав лент: сбрасывается только сам пост
+        cache.bump(*post_scopes(instance))
+    else:
+        cache.bump_members(*post_scopes(instance))
+    idlists.forget(instance.pk)
+    instance._loaded_group_id = instance.group_id
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_pages(sender, instance, **kwargs):
+    # после удаления посты уже без группы, и по ней их не найти
+    instance._shown = shown_pages(instance.posts.all())
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, created=None, **kwargs):
+    post_ids, scopes = (), ()
+    if created is None:
+        post_ids, scopes = instance._shown
+    elif not created:
+        post_ids, scopes = shown_pages(instance.posts.all())
+    # в кешированных постах (posts.idlists) группа загружена вместе с ними
+    idlists.forget(*post_ids)
+    cache.bump(*scopes)
+    # посты удалённой группы остаются без группы, не пройдя через сигналы
+    cache.bump_members(
+        cache.index_scope(),
+        cache.group_scope(instance.slug),
+        cache.group_scope(instance._loaded_slug),
+    )
+    cache.bump(cache.group_cards_scope(instance.pk),
+               backend=cache.card_cache())
+    instance._loaded_slug = instance.slug
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author_cards(sender, instance, created=None,
+                            update_fields=None, **kwargs):
+    # вход в аккаунт сохраняет только last_login, которого нет в карточках
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    # посты и комментарии удалённого автора сбросили свои ленты сами
+    post_ids, scopes = (), ()
+    if created is False:
+        post_ids, scopes = shown_pages(
+            instance.posts.all(), instance.comments.all())
+    idlists.forget(*post_ids)
+    usernames = {instance.username, instance._loaded_username} - {None}
+    cache.bump(*(cache.author_scope(name) for name in usernames), *scopes)
+    cache.bump(cache.user_cards_scope(instance.pk),
+               backend=cache.card_cache())
+    instance._loaded_username = instance.username
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_post(sender, instance, **kwargs):
+    cache.bump(cache.post_scope(instance.post_id))
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user(instance.user_id, 'following_count', 1)
+        counters.change_user(instance.author_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+@_single_follow
+def count_deleted_follow(sender, instance, **kwargs):
+    counters.change_user(instance.user_id, 'following_count', -1)
+    counters.change_user(instance.author_id, 'followers_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+@_single_follow
+def prune_feed(sender, instance, **kwargs):
+    feed.prune(instance.user_id, instance.author_id)
+    feed.schedule_refill([instance.author_id])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+@_single_follow
+def invalidate_follow_pages(sender, instance, **kwargs):
+    # кнопка подписки и счётчики подписок в профилях обоих пользователей
+    if Follow.user.is_cached(instance) and Follow.author.is_cached(instance):
+        usernames = [instance.user.username, instance.author.username]
+    else:
+        usernames = User.objects.filter(
+            pk__in=[instance.user_id, instance.author_id]
+        ).values_list('username', flat=True)
+    cache.bump_members(cache.feed_scope(instance.user_id))
+    cache.bump(*(cache.author_scope(username) for username in usernames))
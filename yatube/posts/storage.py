@@ -0,0 +1,90 @@
+"""Хранилище картинок постов с адресацией по содержимому.
+
+Файл сохраняется под sha256 своего содержимого: `posts/ab/abcd….jpg`.
+Одинаковые картинки, загруженные к разным постам, лежат на диске один
+раз, а миниатюры sorl, ключ которых строится по имени файла, нарезаются
+для них тоже один раз. Счётчиком ссылок служат сами посты: файл и его
+миниатюры удаляются `release`, когда на имя не ссылается ни один пост.
+
+Проверка ссылок и удаление идут в транзакции, то есть под блокировкой
+записи в базу (`BEGIN IMMEDIATE`, см. core.db_backends). Под ней же
+сохраняется пост с новым файлом (`Post.save`), поэтому файл, уже
+найденный на диске в `_save`, не удалится до вставки поста.
+"""
+import hashlib
+import os
+import re
+
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.utils.deconstruct import deconstructible
+from sorl.thumbnail import delete as delete_thumbnails
+
+
+def digest(content):
+    """sha256 файла, прочитанного по частям."""
+    hasher = hashlib.sha256()
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+CONTENT_NAME_RE = re.compile(r'(^|/)([0-9a-f]{2})/\2[0-9a-f]{62}(\.\w+)?$')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def is_content_name(self, name):
+        return bool(CONTENT_NAME_RE.search(name))
+
+    def content_name(self, name, content):
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        key = digest(content)
+        return os.path.join(directory, key[:2], key + extension)
+
+    def _save(self, name, content):
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        saved = super()._save(name, content)
+        if saved != name:
+            # тот же файл успели записать параллельно: копия не нужна
+            super().delete(saved)
+        return name
+
+
+post_images = ContentAddressedStorage()
+
+
+def release(name):
+    """Удаляет картинку и её миниатюры, если она больше не нужна постам."""
+    from .models import Post
+
+    if not name:
+        return False
+    with transaction.atomic():
+        if Post.objects.filter(image=name).exists():
+            return False
+        delete_thumbnails(Post(image=name).image)
+    return True
+
+
+def adopt(name):
+    """Переносит картинку, сохранённую до этого хранилища, под её хеш.
+
+    Посты пересохраняются с новым именем, поэтому старый файл и его
+    миниатюры удаляет `release`, а кеш страниц сбрасывают сигналы.
+    Возвращает новое имя.
+    """
+    from .models import Post
+
+    if post_images.is_content_name(name) or not post_images.exists(name):
+        return name
+    with transaction.atomic():
+        with post_images.open(name) as content:
+            new_name = post_images.save(name, content)
+        for post in Post.objects.filter(image=name):
+            post.image.name = new_name
+            post.save(update_fields=['image', 'updated'])
+    return new_name
@@ -0,0 +1,58 @@
+from django import template
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .. import thumbnails
+from ..cache import (
+    card_cache, get_with_versions, group_cards_scope, user_cards_scope,
+)
+
+register = template.Library()
+
+CARD_TEMPLATE = 'includes/post_card.html'
+
+
+def card_scopes(post):
+    scopes = [user_cards_scope(post.author_id)]
+    if post.group_id:
+        scopes.append(group_cards_scope(post.group_id))
+    return scopes
+
+
+def card_key(post):
+    """Ключ карточки меняется при сохранении поста."""
+    return f'post-card:{post.pk}:{post.updated.timestamp()}'
+
+
+def card_stamp(post, versions):
+    """Версии автора и группы, с которыми отрисована карточка.
+
+    Хранятся рядом с карточкой, а не в ключе: тогда версии и карточки
+    достаются одним `get_many`. `versions` — версии по именам лент.
+    """
+    return tuple(versions[scope] for scope in card_scopes(post))
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов страницы: готовые и их версии — одним get_many."""
+    posts = list(posts)
+    scopes = list({scope for post in posts for scope in card_scopes(post)})
+    cache = card_cache()
+    keys = [card_key(post) for post in posts]
+    cached, versions = get_with_versions(keys, scopes, cache)
+    versions = dict(zip(scopes, versions))
+    cards = {}
+    fresh = {}
+    for key, post in zip(keys, posts):
+        stamp = card_stamp(post, versions)
+        if key in cached and cached[key][0] == stamp:
+            cards[key] = cached[key][1]
+            continue
+        cards[key] = render_to_string(CARD_TEMPLATE, {'post': post})
+        # карточку с заменителем миниатюры в кеш не кладём
+        if not post.image or thumbnails.is_ready(post.image):
+            fresh[key] = (stamp, cards[key])
+    cache.set_many(fresh, settings.POST_CARD_CACHE_TIMEOUT)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,40 @@
+from django import template
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(image, name='card'):
+    """Готовая миниатюра картинки поста или заменитель с оригиналом."""
+    return thumbnails.thumbnail_or_fallback(image, name)
+
+
+def _srcset(variants):
+    return ', '.join(f'{thumbnail.url} {width}w'
+                     for thumbnail, width in variants)
+
+
+@register.inclusion_tag('includes/post_picture.html')
+def post_picture(image, name='card', sizes='100vw'):
+    """`<picture>` с WebP и JPEG в нескольких ширинах.
+
+    Пока нарезаны не все варианты, выводится одна картинка, как у
+    `post_thumbnail`.
+    """
+    if not image:
+        return {}
+    sources = thumbnails.srcset(image, name)
+    if sources is None:
+        return {'fallback': thumbnails.thumbnail_or_fallback(image, name)}
+    jpeg = sources['JPEG']
+    largest, width = jpeg[-1]
+    return {
+        'webp_srcset': _srcset(sources['WEBP']),
+        'jpeg_srcset': _srcset(jpeg),
+        'src': largest.url,
+        'width': width,
+        'height': largest.height,
+        'sizes': sizes,
+    }
@@ -1,3 +1,4 @@
+import hashlib
 import shutil
 import tempfile
 
@@ -62,6 +63,8 @@ class PictureWorksTests(TestCase):
 
     def test_pictures_created_by_form(self):
         b4_test = Post.objects.count()
+        # файл уже прочитан при создании поста в setUpClass
+        self.uploaded.seek(0)
         form_data = {
             'author': self.user,
             'text': 'Тестовый текст',
@@ -78,7 +81,9 @@ class PictureWorksTests(TestCase):
                                                args=[self.user.username]))
 
     def test_context_gets_picture(self):
-        exp_pic_name = 'posts/small.gif'
+        # картинки хранятся под sha256 содержимого
+        digest = hashlib.sha256(self.small_gif).hexdigest()
+        exp_pic_name = f'posts/{digest[:2]}/{digest}.gif'
         reverses = [
             reverse('posts:index'),
             reverse('posts:profile', args=[self.user.username]),
@@ -128,17 +133,20 @@ class CacheWorkingTests(TestCase):
         response = self.guest_client.get(reverse('posts:index'))
         calculated_content = response.content
 
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(calculated_content, response.content)
+        self.assertIsNone(response.context)
+
         Post.objects.create(
             text='whatever',
             author=self.user,
         )
         response = self.guest_client.get(reverse('posts:index'))
-        self.assertEqual(calculated_content, response.content)
-        self.assertIsNone(response.context)
+        self.assertNotEqual(calculated_content, response.content)
+        self.assertIsNotNone(response.context)
 
-        caches['index_page'].clear()
+        caches['pages'].clear()
         response = self.guest_client.get(reverse('posts:index'))
-        self.assertNotEqual(calculated_content, response.content)
         self.assertIsNotNone(response.context)
 
 
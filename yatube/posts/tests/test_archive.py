@@ -0,0 +1,143 @@
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from .. import archive
+from ..models import Comment, FeedEntry, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='-')
+
+    def test_round_trip(self):
+        """Выгруженный архив загружается обратно с теми же датами."""
+        post = Post.objects.create(
+            author=self.author, group=self.group, text='пост')
+        Comment.objects.create(post=post, author=self.reader, text='ответ')
+        Follow.objects.create(user=self.reader, author=self.author)
+        pub_date = Post.objects.get(pk=post.pk).pub_date
+        dump = io.StringIO()
+        self.assertEqual(archive.write_jsonl(dump, archive.FIELDS), 3)
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+
+        dump.seek(0)
+        stats = archive.Importer(batch_size=2).load(archive.read_jsonl(dump))
+        self.assertEqual(
+            stats, {'post': 1, 'comment': 1, 'follow': 1, 'skipped': 0})
+        restored = Post.objects.get(pk=post.pk)
+        self.assertEqual(restored.pub_date, pub_date)
+        self.assertEqual(restored.group, self.group)
+        self.assertEqual(restored.comments_count, 1)
+        self.assertEqual(UserStats.objects.get(user=self.author).posts_count,
+                         1)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=restored).exists())
+
+    def test_csv_import_command(self):
+        rows = (
+            'id,author,group,text,pub_date,image\n'
+            ',writer,group,первый,2020-01-02T03:04:05,\n'
+            ',newbie,,второй,,\n'
+            ',ghost,missing,третий,,\n'
+        )
+        path = self.write_file(rows)
+        out = io.StringIO()
+        call_command('import_posts', path, '--create-missing', stdout=out)
+        self.assertIn('строк/с', out.getvalue())
+        first = Post.objects.get(text='первый')
+        self.assertEqual(first.pub_date,
+                         datetime(2020, 1, 2, 3, 4, 5, tzinfo=timezone.utc))
+        self.assertEqual(first.group, self.group)
+        self.assertTrue(User.objects.filter(username='newbie').exists())
+        self.assertTrue(Group.objects.filter(slug='missing').exists())
+        post = Post.objects.create(author=self.author, text='после')
+        self.assertGreater(post.pk, first.pk)
+
+    def test_unknown_author_skipped(self):
+        records = [
+            {'type': 'post', 'author': 'ghost', 'text': '-'},
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+        ]
+        stats = archive.Importer().load(records)
+        # повтор подписки не вставлен и считается пропущенным
+        self.assertEqual(stats['follow'], 1)
+        self.assertEqual(stats['skipped'], 2)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_recount_limited_to_imported_users(self):
+        """Счётчики и ленты пересчитываются только у затронутых загрузкой."""
+        other = User.objects.create_user(username='other')
+        UserStats.objects.filter(user=other).update(posts_count=7)
+        archive.Importer().load([
+            {'type': 'post', 'author': 'writer', 'text': 'пост'},
+            {'type': 'follow', 'user': 'reader', 'author': 'writer'},
+        ])
+        self.assertEqual(UserStats.objects.get(user=other).posts_count, 7)
+        stats = UserStats.objects.get(user=self.author)
+        self.assertEqual((stats.posts_count, stats.followers_count), (1, 1))
+        self.assertEqual(
+            UserStats.objects.get(user=self.reader).following_count, 1)
+        self.assertEqual(FeedEntry.objects.filter(user=self.reader).count(),
+                         1)
+
+    def test_export_command_csv(self):
+        Post.objects.create(author=self.author, text='пост')
+        path = self.write_file('')
+        call_command('export_posts', path, '--format', 'csv',
+                     '--type', 'post', stderr=io.StringIO())
+        with open(path, encoding='utf-8') as dump:
+            lines = dump.read().splitlines()
+        self.assertEqual(lines[0], ','.join(archive.FIELDS['post']))
+        self.assertIn('writer', lines[1])
+
+    def test_reimport_skips_existing_ids(self):
+        post = Post.objects.create(author=self.author, text='пост')
+        Comment.objects.create(post=post, author=self.reader, text='ответ')
+        dump = io.StringIO()
+        archive.write_jsonl(dump, ['post', 'comment'])
+        dump.seek(0)
+        records = list(archive.read_jsonl(dump))
+        records.append({'type': 'post', 'author': 'writer', 'text': 'новый'})
+        stats = archive.Importer(batch_size=2).load(records)
+        self.assertEqual(
+            stats, {'post': 1, 'comment': 0, 'follow': 0, 'skipped': 2})
+        self.assertEqual(Post.objects.count(), 2)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+
+    def test_bad_post_reference(self):
+        path = self.write_file(
+            json.dumps({'type': 'comment', 'post': 'первый',
+                        'author': 'reader', 'text': '-'}) + '\n')
+        with self.assertRaisesMessage(CommandError, 'первый'):
+            call_command('import_posts', path, '--format', 'jsonl',
+                         stdout=io.StringIO())
+
+    def test_broken_line(self):
+        with self.assertRaises(archive.ArchiveError):
+            list(archive.read_jsonl(io.StringIO(
+                json.dumps({'type': 'post'}) + '\n{oops\n')))
+
+    def write_file(self, content):
+        handle = tempfile.NamedTemporaryFile(
+            'w', suffix='.csv', delete=False, encoding='utf-8')
+        with handle:
+            handle.write(content)
+        self.addCleanup(os.remove, handle.name)
+        return handle.name
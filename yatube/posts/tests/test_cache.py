@@ -0,0 +1,305 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.group = Group.objects.create(
+            title='Первая', slug='first', description='-')
+        cls.other_group = Group.objects.create(
+            title='Вторая', slug='second', description='-')
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='перенесённый пост')
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.guest_client = Client()
+
+    def get_is_cached(self, url):
+        """True, если страница отдана из кеша без рендеринга."""
+        return self.guest_client.get(url).context is None
+
+    def test_new_post_invalidates_index_at_once(self):
+        url = reverse('posts:index')
+        self.assertFalse(self.get_is_cached(url))
+        self.assertTrue(self.get_is_cached(url))
+        Post.objects.create(author=self.user, text='свежий')
+        response = self.guest_client.get(url)
+        self.assertContains(response, 'свежий')
+
+    def test_only_affected_group_invalidated(self):
+        first = reverse('posts:group_list', args=[self.group.slug])
+        second = reverse('posts:group_list', args=[self.other_group.slug])
+        self.guest_client.get(first)
+        self.guest_client.get(second)
+        self.post.text = 'исправлено'
+        self.post.save()
+        self.assertFalse(self.get_is_cached(first))
+        self.assertTrue(self.get_is_cached(second))
+
+    def test_moved_post_invalidates_old_group(self):
+        url = reverse('posts:group_list', args=[self.group.slug])
+        self.guest_client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.group = self.other_group
+        post.save()
+        self.assertNotContains(self.guest_client.get(url),
+                               'перенесённый пост')
+
+    def test_comment_keeps_index_cached(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Comment.objects.create(post=self.post, author=self.user, text='!')
+        self.assertTrue(self.get_is_cached(url))
+
+    def test_users_do_not_share_pages(self):
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        client = Client()
+        client.force_login(self.user)
+        self.assertContains(client.get(url), 'Пользователь: leo')
+
+
+class HolePunchingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='пост')
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_page_rendered_once_for_all_users(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        response = Client().get(url)
+        self.assertIn('post', response.context)
+        for client, name in ((self.author_client, 'writer'),
+                             (self.reader_client, 'reader')):
+            with self.subTest(user=name):
+                response = client.get(url)
+                self.assertNotIn('post', response.context)
+                self.assertContains(response, f'Пользователь: {name}')
+                self.assertNotContains(response, '<!--hole:')
+
+    def test_guest_page_cached_whole(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        self.assertIsNotNone(Client().get(url).context)
+        response = Client().get(url)
+        self.assertIsNone(response.context)
+        self.assertContains(response, 'Войти')
+
+    def test_follow_button_of_current_user(self):
+        url = reverse('posts:profile', args=[self.author.username])
+        self.author_client.get(url)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertContains(self.reader_client.get(url), 'Отписаться')
+        self.assertContains(self.author_client.get(url), 'Подписаться')
+
+    def test_edit_button_and_comment_form(self):
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        edit_url = reverse('posts:post_edit', args=[self.post.pk])
+        comment_url = reverse('posts:add_comment', args=[self.post.pk])
+        response = self.author_client.get(url)
+        self.assertContains(response, edit_url)
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        response = self.reader_client.get(url)
+        self.assertNotContains(response, edit_url)
+        self.assertContains(response, comment_url)
+        response = Client().get(url)
+        self.assertNotContains(response, comment_url)
+        self.assertNotContains(response, 'csrfmiddlewaretoken')
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.first = Post.objects.create(author=cls.user, text='первый')
+        cls.second = Post.objects.create(author=cls.user, text='второй')
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.url = reverse('posts:profile', args=[self.user.username])
+
+    def render_page(self):
+        caches['pages'].clear()
+        return self.client.get(self.url)
+
+    def test_warm_cards_not_rendered(self):
+        """Готовые карточки берутся из кеша, шаблон не рендерится."""
+        response = self.render_page()
+        self.assertTemplateUsed(response, 'includes/post_card.html')
+        response = self.render_page()
+        self.assertTemplateNotUsed(response, 'includes/post_card.html')
+        self.assertContains(response, 'первый')
+
+    def test_warm_cards_in_one_round_trip(self):
+        """Карточки и версии их авторов и групп — один get_many."""
+        self.render_page()
+        default = caches['default']
+        with mock.patch.object(default, 'get_many',
+                               wraps=default.get_many) as get_many:
+            self.render_page()
+        self.assertEqual(get_many.call_count, 1)
+
+    def test_cards_shared_between_feeds(self):
+        self.render_page()
+        response = self.client.get(reverse('posts:index'))
+        self.assertTemplateNotUsed(response, 'includes/post_card.html')
+
+    def test_group_and_author_changes_refresh_cards(self):
+        group = Group.objects.create(
+            title='Группа', slug='old', description='-')
+        Post.objects.filter(pk=self.first.pk).update(group=group)
+        self.render_page()
+        group.slug = 'new'
+        group.save()
+        self.user.first_name = 'Лев'
+        self.user.save()
+        response = self.render_page()
+        self.assertContains(
+            response, reverse('posts:group_list', args=['new']))
+        self.assertNotContains(
+            response, reverse('posts:group_list', args=['old']))
+        self.assertContains(response, 'Лев')
+
+    def test_edit_invalidates_only_its_card(self):
+        self.render_page()
+        self.client.post(
+            reverse('posts:post_edit', args=[self.first.pk]),
+            {'text': 'исправленный'},
+        )
+        response = self.render_page()
+        cards = [
+            template for template in response.templates
+            if template.name == 'includes/post_card.html'
+        ]
+        self.assertEqual(len(cards), 1)
+        self.assertContains(response, 'исправленный')
+        self.assertContains(response, 'второй')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='пост')
+
+    def setUp(self):
+        caches['pages'].clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def revalidate(self, url):
+        """Статус повторного запроса с ETag первого."""
+        etag = self.client.get(url)['ETag']
+        return lambda: self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_not_modified_until_changed(self):
+        urls = {
+            reverse('posts:index'): lambda: Post.objects.create(
+                author=self.author, text='новый'),
+            reverse('posts:profile', args=[self.author.username]):
+                lambda: Follow.objects.create(
+                    user=self.reader, author=self.author),
+            reverse('posts:post_detail', args=[self.post.pk]):
+                lambda: Comment.objects.create(
+                    post=self.post, author=self.reader, text='!'),
+        }
+        for url, change in urls.items():
+            with self.subTest(url=url):
+                again = self.revalidate(url)
+                response = again()
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.content)
+                change()
+                self.assertEqual(again().status_code, 200)
+
+    def test_follow_feed_sees_author_edits(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        again = self.revalidate(reverse('posts:follow_index'))
+        self.assertEqual(again().status_code, 304)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'исправлено'
+        post.save()
+        self.assertEqual(again().status_code, 200)
+
+    def test_group_change_refreshes_pages_with_its_posts(self):
+        """Ссылка на группу есть в профиле, посте и ленте подписок."""
+        group = Group.objects.create(
+            title='Группа', slug='old', description='-')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        Follow.objects.create(user=self.reader, author=self.author)
+        urls = [
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+            reverse('posts:follow_index'),
+        ]
+        checks = [self.revalidate(url) for url in urls]
+        group.slug = 'new'
+        group.save()
+        for url, again in zip(urls, checks):
+            with self.subTest(url=url):
+                self.assertContains(
+                    again(), reverse('posts:group_list', args=['new']))
+
+    def test_author_change_refreshes_pages_with_posts(self):
+        """Имя автора есть на главной и в группах его постов."""
+        group = Group.objects.create(
+            title='Группа', slug='named', description='-')
+        Post.objects.filter(pk=self.post.pk).update(group=group)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[group.slug]),
+        ]
+        checks = [self.revalidate(url) for url in urls]
+        self.author.first_name = 'Лев'
+        self.author.save()
+        for url, again in zip(urls, checks):
+            with self.subTest(url=url):
+                self.assertContains(again(), 'Лев')
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_stale_page_has_no_validators(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        Post.objects.create(author=self.author, text='свежий пост')
+        # заготовку новой версии пересчитывает другой воркер
+        with mock.patch('core.singleflight._acquire', return_value=False):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'свежий пост')
+        self.assertNotIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('no-store', response['Cache-Control'])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'свежий пост')
+        self.assertIn('ETag', response)
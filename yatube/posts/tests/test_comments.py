@@ -0,0 +1,73 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Comment, Post
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=5)
+class CommentPagesTests(QueryBudgetMixin, TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='talker')
+        cls.post = Post.objects.create(author=author, text='обсуждаемый')
+        for number in range(12):
+            Comment.objects.create(
+                post=cls.post,
+                author=User.objects.create_user(username=f'reader{number}'),
+                text=f'комментарий {number}',
+            )
+        cls.detail_url = reverse('posts:post_detail', args=[cls.post.pk])
+        cls.fragment_url = reverse('posts:post_comments', args=[cls.post.pk])
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = Client()
+
+    def texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_first_page_on_post(self):
+        """На странице поста первая страница комментариев и их число."""
+        response = self.assertQueryBudget(self.client, self.detail_url, 3)
+        page = response.context['comments']
+        self.assertEqual(self.texts(page), [
+            f'комментарий {number}' for number in range(11, 6, -1)])
+        self.assertTrue(page.has_next())
+        self.assertContains(response, 'Комментариев:  <span >12</span>')
+        self.assertContains(
+            response, f'?cursor={page.next_cursor}', html=False)
+
+    def test_fragment_pages(self):
+        """Фрагменты отдают оставшиеся комментарии без повторов."""
+        cursor = self.client.get(
+            self.detail_url).context['comments'].next_cursor
+        seen = []
+        while cursor:
+            response = self.assertQueryBudget(
+                self.client, f'{self.fragment_url}?cursor={cursor}', 2)
+            self.assertTemplateUsed(response, 'includes/comment_list.html')
+            self.assertNotContains(response, '<html')
+            page = response.context['comments']
+            seen += self.texts(page)
+            cursor = page.next_cursor if page.has_next() else None
+        self.assertEqual(seen, [
+            f'комментарий {number}' for number in range(6, -1, -1)])
+
+    def test_page_without_javascript(self):
+        cursor = self.client.get(
+            self.detail_url).context['comments'].next_cursor
+        response = self.client.get(self.detail_url, {'comments': cursor})
+        self.assertEqual(self.texts(response.context['comments'])[0],
+                         'комментарий 6')
+
+    def test_fragment_of_missing_post(self):
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 100]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,96 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='writer')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_posts_count(self):
+        post = Post.objects.create(author=self.author, text='первый')
+        Post.objects.create(author=self.author, text='второй')
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+
+    def test_comments_count(self):
+        post = Post.objects.create(author=self.author, text='пост')
+        self.client.post(reverse('posts:add_comment', args=[post.pk]),
+                         {'text': 'комментарий'})
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        Comment.objects.get(post=post).delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+
+    def test_follow_counts(self):
+        url = reverse('posts:profile_follow', args=[self.author.username])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.client.get(reverse('posts:profile_unfollow',
+                                args=[self.author.username]))
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_reads_counter_without_count(self):
+        Post.objects.create(author=self.author, text='пост')
+        url = reverse('posts:profile', args=[self.author.username])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        stats_reads = [
+            query for query in queries
+            if 'posts_userstats' in query['sql']
+            and 'COUNT(' not in query['sql'].upper()
+        ]
+        self.assertTrue(stats_reads)
+        self.assertEqual(response.context['author'].stats.posts_count, 1)
+
+    def test_delete_user_with_posts_comments_and_follows(self):
+        doomed = User.objects.create_user(username='doomed')
+        post = Post.objects.create(author=doomed, text='пост')
+        Comment.objects.create(post=post, author=self.reader, text='-')
+        other = Post.objects.create(author=self.author, text='чужой')
+        Comment.objects.create(post=other, author=doomed, text='-')
+        Follow.objects.create(user=doomed, author=self.author)
+        Follow.objects.create(user=self.reader, author=doomed)
+        doomed.delete()
+        self.assertFalse(UserStats.objects.filter(user_id=doomed.pk).exists())
+        other.refresh_from_db()
+        self.assertEqual(other.comments_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_recount_repairs_drift(self):
+        post = Post.objects.create(author=self.author, text='пост')
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=self.reader, text='-')] * 3)
+        Follow.objects.bulk_create(
+            [Follow(user=self.reader, author=self.author)])
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('recount', stdout=open('/dev/null', 'w'))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 3)
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
@@ -0,0 +1,124 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+
+from ..feed import follow_feed, rebuild_feeds
+from ..models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(author=cls.author, text='old')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def test_follow_backfills_feed(self):
+        """Подписка добавляет в ленту уже опубликованные посты."""
+        self.client.get(reverse('posts:profile_follow',
+                                args=(self.author.username,)))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=self.old_post).exists())
+        self.assertIn(self.old_post, follow_feed(self.reader))
+
+    def test_repeated_follow_not_duplicated(self):
+        url = reverse('posts:profile_follow', args=(self.author.username,))
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(Follow.objects.filter(
+            user=self.reader, author=self.author).count(), 1)
+
+    def test_new_post_fanned_out(self):
+        """Новый пост раскладывается по лентам подписчиков."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='new')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.context['page_obj'][0], post)
+
+    def test_unfollow_prunes_feed(self):
+        """Отписка убирает посты автора из ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.get(reverse('posts:profile_unfollow',
+                                args=(self.author.username,)))
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertNotIn(self.old_post, follow_feed(self.reader))
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_heavy_author_read_on_demand(self):
+        """Посты «тяжёлых» авторов подмешиваются при чтении."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='new')
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(list(follow_feed(self.reader)),
+                         [post, self.old_post])
+
+    @override_settings(FEED_BATCH_SIZE=2)
+    def test_entries_written_in_batches(self):
+        """Один автор с подписчиками не собирает все записи в одну пачку."""
+        other = User.objects.create_user(username='other')
+        Post.objects.bulk_create(
+            [Post(author=self.author, text=str(n)) for n in range(2)])
+        with mock.patch.object(FeedEntry.objects, 'bulk_create',
+                               wraps=FeedEntry.objects.bulk_create) as create:
+            Follow.objects.create(user=self.reader, author=self.author)
+            FeedEntry.objects.all().delete()
+            Follow.objects.bulk_create(
+                [Follow(user=other, author=self.author)])
+            self.assertEqual(rebuild_feeds(), 6)
+        self.assertEqual(FeedEntry.objects.count(), 6)
+        sizes = [len(call.args[0]) for call in create.call_args_list]
+        self.assertLessEqual(max(sizes), 2)
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class RefillFeedTests(TransactionTestCase):
+    """Дозаполнение идёт после коммита отписки: без общей транзакции."""
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.reader = User.objects.create_user(username='reader')
+        self.other = User.objects.create_user(username='other')
+        self.author = User.objects.create_user(username='writer')
+        self.old_post = Post.objects.create(author=self.author, text='old')
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client = Client()
+        self.client.force_login(self.other)
+
+    def test_author_back_under_limit_refilled(self):
+        """Посты, опубликованные «тяжёлым» автором, не пропадают из ленты."""
+        Follow.objects.create(user=self.other, author=self.author)
+        post = Post.objects.create(author=self.author, text='new')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        self.client.get(reverse('posts:profile_unfollow',
+                                args=(self.author.username,)))
+        self.assertEqual(list(follow_feed(self.reader)),
+                         [post, self.old_post])
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=post).exists())
+
+    def test_only_missed_posts_refilled(self):
+        """Уже разложенные посты при возврате к порогу не пишутся заново."""
+        with mock.patch.object(FeedEntry.objects, 'bulk_create',
+                               wraps=FeedEntry.objects.bulk_create) as create:
+            Follow.objects.create(user=self.other, author=self.author)
+            self.client.get(reverse('posts:profile_unfollow',
+                                    args=(self.author.username,)))
+        written = [entry.post_id for call in create.call_args_list
+                   for entry in call.args[0]]
+        self.assertNotIn(self.old_post.pk, written)
+        self.assertEqual(FeedEntry.objects.filter(
+            user=self.reader, post=self.old_post).count(), 1)
@@ -0,0 +1,95 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import idlists
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedIdListTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.group = Group.objects.create(
+            title='Группа', slug='ids', description='-')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.posts = [
+            Post.objects.create(
+                author=cls.author, group=cls.group, text=f'пост {number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.url = reverse('posts:follow_index')
+
+    def post_queries(self):
+        """Запросы к таблице постов при показе ленты подписок."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        sql = [q['sql'] for q in queries if 'FROM "posts_post"' in q['sql']]
+        return response, sql
+
+    def test_warm_page_without_post_queries(self):
+        self.client.get(self.url)
+        response, sql = self.post_queries()
+        self.assertEqual(sql, [])
+        self.assertEqual(len(response.context['page_obj']), 3)
+
+    def test_edit_reloads_only_edited_post(self):
+        self.client.get(self.url)
+        post = Post.objects.get(pk=self.posts[1].pk)
+        post.text = 'исправлено'
+        post.save()
+        response, sql = self.post_queries()
+        self.assertEqual(len(sql), 1)
+        self.assertIn(f'IN ({post.pk})', sql[0])
+        self.assertContains(response, 'исправлено')
+        self.assertEqual(
+            [p.pk for p in response.context['page_obj']],
+            [p.pk for p in reversed(self.posts)],
+        )
+
+    def test_membership_changes_seen(self):
+        self.client.get(self.url)
+        new = Post.objects.create(author=self.author, text='новый')
+        self.assertContains(self.client.get(self.url), 'новый')
+        new.delete()
+        self.assertNotContains(self.client.get(self.url), 'новый')
+        Follow.objects.filter(user=self.reader).delete()
+        self.assertEqual(
+            len(self.client.get(self.url).context['page_obj']), 0)
+
+    def test_moved_post_leaves_group_page(self):
+        url = reverse('posts:group_list', args=[self.group.slug])
+        self.client.get(url)
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.group = None
+        post.save()
+        page = self.client.get(url).context['page_obj']
+        self.assertEqual(page.paginator.count, 2)
+        self.assertNotIn(post, list(page))
+
+    def test_author_and_group_edits_reload_posts(self):
+        """В посте из кеша автор и группа загружены вместе с ним."""
+        self.client.get(self.url)
+        ids = [post.pk for post in self.posts]
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        author = User.objects.get(pk=self.author.pk)
+        author.first_name = 'Лев'
+        author.save()
+        for post in idlists.hydrate(ids, Post.objects.for_feed()):
+            self.assertEqual(post.group.title, 'Новое название')
+            self.assertEqual(post.author.first_name, 'Лев')
@@ -0,0 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Post
+from ..paginators import CursorPage, CursorPaginator
+
+User = get_user_model()
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        for number in range(13):
+            Post.objects.create(author=cls.user, text=f'post {number}')
+        cls.paginator = CursorPaginator(Post.objects.all(), 10)
+
+    def test_walk_forward_and_back(self):
+        """Страницы по курсору не пересекаются и листаются назад."""
+        first = self.paginator.get_page()
+        self.assertEqual(len(first), 10)
+        self.assertTrue(first.has_next())
+        self.assertFalse(first.has_previous())
+
+        second = self.paginator.get_page(first.next_cursor)
+        self.assertEqual(len(second), 3)
+        self.assertFalse(second.has_next())
+        self.assertTrue(second.has_previous())
+        self.assertFalse(set(first) & set(second))
+
+        back = self.paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_no_count_query(self):
+        """Страница выбирается одним запросом без COUNT(*)."""
+        first = self.paginator.get_page()
+        with CaptureQueriesContext(connection) as queries:
+            list(self.paginator.get_page(first.next_cursor))
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('COUNT(', queries[0]['sql'].upper())
+
+    def test_broken_cursor_gives_first_page(self):
+        page = self.paginator.get_page('not-a-cursor')
+        self.assertEqual(list(page), list(self.paginator.get_page()))
+
+    def test_view_opts_into_cursor_mode(self):
+        """Параметр ?cursor= переключает ленту на курсорный режим."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:profile',
+                                      args=[self.user.username]),
+                              {'cursor': ''})
+        self.assertIsInstance(response.context['page_obj'], CursorPage)
+        self.assertContains(response, '?cursor=')
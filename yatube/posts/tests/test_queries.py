@@ -0,0 +1,80 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class FeedQueryBudgetTests(QueryBudgetMixin, TestCase):
+    """Число запросов страницы не зависит от числа постов на ней."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='-')
+        for number in range(12):
+            author = User.objects.create_user(username=f'author{number}')
+            Follow.objects.create(user=cls.reader, author=author)
+            post = Post.objects.create(
+                author=author, group=cls.group, text=f'post {number}')
+            Comment.objects.create(post=post, author=cls.reader, text='!')
+        cls.post = post
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.guest_client = Client()
+        self.auth_client = Client()
+        self.auth_client.force_login(self.reader)
+
+    def tearDown(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def test_guest_budgets(self):
+        budgets = {
+            reverse('posts:index'): 2,
+            reverse('posts:group_list', args=[self.group.slug]): 3,
+            reverse('posts:profile', args=['author0']): 3,
+            # плюс имя автора для версии страницы
+            reverse('posts:post_detail', args=[self.post.pk]): 3,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.guest_client, url, budget)
+
+    def test_authorized_budgets(self):
+        # плюс сессия и пользователь
+        budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:group_list', args=[self.group.slug]): 5,
+            reverse('posts:profile', args=['author0']): 6,
+            reverse('posts:post_detail', args=[self.post.pk]): 5,
+            reverse('posts:follow_index'): 5,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.auth_client, url, budget)
+
+    def test_form_pages_do_not_lock_for_writing(self):
+        """GET формы не открывает транзакцию записи."""
+        urls = [
+            reverse('posts:post_create'),
+            reverse('posts:add_comment', args=[self.post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.auth_client.get(url)
+                self.assertFalse([
+                    query for query in queries
+                    if query['sql'].startswith(('SAVEPOINT', 'BEGIN'))
+                ])
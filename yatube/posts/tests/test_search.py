@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import search
+from ..models import Comment, Post
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+        cls.python = Post.objects.create(
+            author=cls.user, text='Программирование на Python: Python всюду')
+        cls.django = Post.objects.create(
+            author=cls.user, text='Django написан на Python')
+        cls.other = Post.objects.create(author=cls.user, text='Про котиков')
+        Comment.objects.create(
+            post=cls.other, author=cls.user, text='котики любят python')
+
+    def setUp(self):
+        self.client = Client()
+
+    def found(self, query, **kwargs):
+        return list(search.search_page(query, **kwargs))
+
+    def test_ranked_by_relevance(self):
+        """Совпадение в посте выше совпадения в комментарии."""
+        found = self.found('python')
+        self.assertEqual(set(found), {self.python, self.django, self.other})
+        self.assertEqual(found[-1], self.other)
+
+    def test_prefix_and_case(self):
+        self.assertEqual(self.found('програм'), [self.python])
+        self.assertEqual(self.found('DJANGO'), [self.django])
+
+    def test_index_follows_edits(self):
+        post = Post.objects.get(pk=self.django.pk)
+        post.text = 'Flask'
+        post.save()
+        self.assertEqual(self.found('django'), [])
+        Post.objects.filter(pk=self.other.pk).delete()
+        self.assertEqual(self.found('котики'), [])
+
+    def test_cursor_pages(self):
+        first = search.search_page('python', per_page=2)
+        self.assertTrue(first.has_next())
+        second = search.search_page(
+            'python', cursor=first.next_cursor, per_page=2)
+        self.assertEqual(len(second), 1)
+        self.assertFalse(second.has_next())
+        back = search.search_page(
+            'python', cursor=second.previous_cursor, per_page=2)
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.found('"python* (:'), self.found('python'))
+        self.assertEqual(self.found('***'), [])
+
+    @override_settings(SEARCH_BACKEND='posts.search.LikeBackend')
+    def test_like_backend(self):
+        self.assertEqual(self.found('Django'), [self.django])
+        self.assertEqual(len(self.found('python')), 3)
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO posts_post_fts(posts_post_fts) "
+                "VALUES ('delete-all')")
+        self.assertEqual(self.found('django'), [])
+        call_command('rebuild_search_index', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.found('django'), [self.django])
+
+    def test_search_page(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'котик'})
+        self.assertEqual(list(response.context['page_obj']), [self.other])
+        self.assertContains(response, 'Про котиков')
+
+    def test_admin_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'django'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.django])
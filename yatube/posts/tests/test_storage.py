@@ -0,0 +1,111 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.db import connection
+from django.test import TransactionTestCase, override_settings
+
+from .. import storage, thumbnails
+from ..models import Post
+from .test_thumbnails import SMALL_GIF
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TransactionTestCase):
+    """Файлы освобождаются после коммита, поэтому без общей транзакции."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='archivist')
+
+    def create_post(self, filename='small.gif', content=SMALL_GIF):
+        post = Post(author=self.user, text='картинка')
+        post.image.save(filename, ContentFile(content), save=False)
+        post.save()
+        return post
+
+    def test_same_content_stored_once(self):
+        """Одинаковые картинки делят файл и миниатюры."""
+        first = self.create_post('one.GIF')
+        second = self.create_post('two.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(storage.post_images.is_content_name(first.image.name))
+        self.assertEqual(os.listdir(os.path.dirname(first.image.path)),
+                         [os.path.basename(first.image.path)])
+        self.assertEqual(
+            thumbnails.lookup(first.image, 'card').url,
+            thumbnails.lookup(second.image, 'card').url,
+        )
+
+    def test_file_removed_with_last_post(self):
+        first = self.create_post()
+        second = self.create_post()
+        path = first.image.path
+        thumbnail = thumbnails.lookup(first.image, 'card')
+        first.delete()
+        self.assertTrue(os.path.exists(path))
+        second.delete()
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(storage.post_images.exists(thumbnail.name))
+
+    def test_save_and_release_under_write_lock(self):
+        """Файл не удаляется между проверкой в `_save` и вставкой поста."""
+        locked = []
+        save = storage.ContentAddressedStorage._save
+
+        def record(method):
+            def wrapper(*args, **kwargs):
+                locked.append(connection.in_atomic_block)
+                return method(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(storage.ContentAddressedStorage, '_save',
+                               record(save)), \
+                mock.patch.object(storage, 'delete_thumbnails',
+                                  record(storage.delete_thumbnails)):
+            post = Post(author=self.user, text='картинка',
+                        image=SimpleUploadedFile('new.gif', SMALL_GIF))
+            post.save()
+            post.delete()
+        # файл поста, его миниатюры и удаление
+        self.assertGreaterEqual(len(locked), 2)
+        self.assertNotIn(False, locked)
+
+    def test_replaced_image_released(self):
+        post = self.create_post()
+        path = post.image.path
+        post.image.save('other.gif', ContentFile(SMALL_GIF + b'\0'))
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(os.path.exists(post.image.path))
+
+    def test_dedupe_images_command(self):
+        """Старые файлы переносятся под хеш, дубликаты удаляются."""
+        legacy = []
+        for number in range(2):
+            name = f'posts/legacy{number}.gif'
+            # так файлы сохранял FileSystemStorage, под исходным именем
+            FileSystemStorage().save(name, ContentFile(SMALL_GIF))
+            legacy.append(Post.objects.create(
+                author=self.user, text='старый', image=name))
+        call_command('dedupe_images', stdout=open(os.devnull, 'w'))
+        names = {post.image.name for post in Post.objects.all()}
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(storage.post_images.is_content_name(name))
+        for post in legacy:
+            self.assertFalse(storage.post_images.exists(post.image.name))
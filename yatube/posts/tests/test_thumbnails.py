@@ -0,0 +1,101 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.post = Post.objects.create(
+            author=self.user, text='с картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+        self.client = Client()
+
+    def test_fallback_until_generated(self):
+        """Пока миниатюры нет, выводится оригинал картинки."""
+        with self.settings(BACKGROUND_TASKS_WORKERS=1):
+            thumbnails._in_flight.add(self.post.pk)
+            try:
+                image = thumbnails.thumbnail_or_fallback(
+                    self.post.image, 'card')
+            finally:
+                thumbnails._in_flight.discard(self.post.pk)
+        self.assertIsInstance(image, thumbnails.Fallback)
+        self.assertEqual(image.url, self.post.image.url)
+        self.assertFalse(thumbnails.is_ready(self.post.image))
+
+    def test_generate_makes_thumbnail_ready(self):
+        thumbnails.generate(self.post.pk)
+        self.assertTrue(thumbnails.is_ready(self.post.image))
+        image = thumbnails.thumbnail_or_fallback(self.post.image, 'card')
+        self.assertNotIsInstance(image, thumbnails.Fallback)
+        self.assertNotEqual(image.url, self.post.image.url)
+
+    def test_post_without_image(self):
+        post = Post.objects.create(author=self.user, text='без картинки')
+        self.assertIsNone(
+            thumbnails.thumbnail_or_fallback(post.image, 'card'))
+
+    def test_pending_card_not_cached(self):
+        """Карточка с заменителем не попадает в кеш карточек."""
+        url = reverse('posts:profile', args=[self.user.username])
+        with self.settings(BACKGROUND_TASKS_WORKERS=1):
+            thumbnails._in_flight.add(self.post.pk)
+            try:
+                self.client.get(url)
+                caches['pages'].clear()
+                response = self.client.get(url)
+            finally:
+                thumbnails._in_flight.discard(self.post.pk)
+        self.assertTemplateUsed(response, 'includes/post_card.html')
+
+    def test_picture_variants(self):
+        """После нарезки карточка выводит WebP и JPEG в двух ширинах."""
+        thumbnails.generate(self.post.pk)
+        sources = thumbnails.srcset(self.post.image, 'card')
+        self.assertEqual(set(sources), {'WEBP', 'JPEG'})
+        for image_format, variants in sources.items():
+            with self.subTest(image_format=image_format):
+                self.assertEqual([width for _, width in variants],
+                                 [480, 960])
+        self.assertTrue(sources['WEBP'][0][0].url.endswith('.webp'))
+        caches['pages'].clear()
+        response = self.client.get(
+            reverse('posts:profile', args=[self.user.username]))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, f'{sources["JPEG"][0][0].url} 480w')
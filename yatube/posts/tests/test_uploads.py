@@ -0,0 +1,85 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from ..forms import PostForm
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+def make_image(size, mode='RGB', image_format='JPEG', **params):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'red').save(buffer, image_format, **params)
+    extension = 'jpg' if image_format == 'JPEG' else image_format.lower()
+    return SimpleUploadedFile(
+        f'photo.{extension}', buffer.getvalue(), f'image/{extension}')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, IMAGE_MAX_SIDE=100)
+class ImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def clean_image(self, upload):
+        form = PostForm({'text': 'фото'}, {'image': upload})
+        self.assertTrue(form.is_valid(), form.errors)
+        return Image.open(form.cleaned_data['image'])
+
+    def test_reencoded_without_metadata(self):
+        """Картинка уменьшена, повёрнута по EXIF и сохранена без EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # повернуть на 90° по часовой
+        exif[0x010F] = 'Camera'
+        image = self.clean_image(make_image((400, 200), exif=exif))
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(image.size, (50, 100))
+        self.assertNotIn('exif', image.info)
+        self.assertTrue(image.info.get('progressive'))
+
+    def test_transparency_kept_as_png(self):
+        image = self.clean_image(
+            make_image((20, 20), 'RGBA', 'PNG'))
+        self.assertEqual(image.format, 'PNG')
+        self.assertEqual(image.mode, 'RGBA')
+
+    def test_limits(self):
+        """Слишком большие файлы и картинки не принимаются."""
+        cases = {
+            'IMAGE_UPLOAD_MAX_BYTES': 10,
+            'IMAGE_MAX_PIXELS': 100,
+        }
+        for setting, value in cases.items():
+            with self.subTest(setting=setting), \
+                    self.settings(**{setting: value}):
+                form = PostForm(
+                    {'text': 'фото'}, {'image': make_image((40, 40))})
+                self.assertFalse(form.is_valid())
+                self.assertIn('image', form.errors)
+
+    def test_create_post_with_image(self):
+        client = Client()
+        client.force_login(self.user)
+        client.post(reverse('posts:post_create'), {
+            'text': 'с фото',
+            'image': make_image((300, 300), image_format='PNG'),
+        })
+        post = Post.objects.get(text='с фото')
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        self.assertEqual((post.image.width, post.image.height), (100, 100))
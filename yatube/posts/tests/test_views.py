@@ -1,6 +1,7 @@
 from django.test import Client, TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import caches
 from django.core.paginator import Page
 from ..forms import PostForm
 from ..models import Post, Group
@@ -29,6 +30,9 @@ class PostsPagesTests(TestCase):
             text='test post' + str(x)
         )) for x in range(1, 14)])
 
+    def setUp(self):
+        caches['pages'].clear()
+
     def no_same_posts(cls, page1, page2):
         result = True
         merged_list = list(page1) + list(page2)
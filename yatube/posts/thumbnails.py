@@ -0,0 +1,141 @@
+"""Заблаговременная нарезка миниатюр картинок постов.
+
+Миниатюры всех размеров из `GEOMETRIES` нарезаются в фоне сразу после
+сохранения поста. Шаблоны только ищут готовую миниатюру и, если её ещё
+нет, показывают оригинал (или заглушку), не дожидаясь Pillow.
+
+Каждый размер нарезается в нескольких вариантах: в масштабах `SCALES`
+для `srcset` и в форматах `FORMATS` — WebP для `<source>` в `<picture>`
+и прогрессивный JPEG (`THUMBNAIL_PROGRESSIVE` sorl) для остальных.
+"""
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.tasks import run_in_background
+
+# размеры, в которых картинки постов выводятся в шаблонах
+GEOMETRIES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+# доли основного размера, нарезаемые для srcset
+SCALES = (0.5, 1)
+FORMATS = ('WEBP', 'JPEG')
+
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+class Fallback:
+    """Заменитель миниатюры, пока она не готова."""
+
+    def __init__(self, url):
+        self.url = url
+
+
+class LookupBackend(ThumbnailBackend):
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из хранилища ключей sorl или None.
+
+        Имя миниатюры вычисляется так же, как в `get_thumbnail`, но сама
+        миниатюра не создаётся.
+        """
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = LookupBackend()
+
+
+def variants(name):
+    """Тройки `(ширина, geometry, options)` всех вариантов размера."""
+    geometry, options = GEOMETRIES[name]
+    width, height = (int(side) for side in geometry.split('x'))
+    for scale in SCALES:
+        size = (round(width * scale), round(height * scale))
+        for image_format in FORMATS:
+            yield size[0], '%dx%d' % size, {**options, 'format': image_format}
+
+
+def lookup(image, name, image_format='JPEG'):
+    geometry, options = GEOMETRIES[name]
+    return backend.lookup(image, geometry, format=image_format, **options)
+
+
+def is_ready(image):
+    return all(
+        backend.lookup(image, geometry, **options)
+        for name in GEOMETRIES
+        for _, geometry, options in variants(name)
+    )
+
+
+def srcset(image, name):
+    """`{формат: [(миниатюра, ширина), ...]}` или None, если не всё готово."""
+    sources = {image_format: [] for image_format in FORMATS}
+    for width, geometry, options in variants(name):
+        thumbnail = backend.lookup(image, geometry, **options)
+        if not thumbnail:
+            return None
+        sources[options['format']].append((thumbnail, width))
+    return sources
+
+
+def generate(post_id):
+    """Нарезает все миниатюры картинки поста."""
+    from .models import Post
+
+    post = Post.objects.filter(pk=post_id).first()
+    try:
+        if post is not None and post.image:
+            for name in GEOMETRIES:
+                for _, geometry, options in variants(name):
+                    get_thumbnail(post.image, geometry, **options)
+            # новая отметка `updated` сбрасывает кеш карточки и страниц,
+            # где вместо миниатюры был заменитель
+            post.save(update_fields=['updated'])
+    finally:
+        with _in_flight_lock:
+            _in_flight.discard(post_id)
+
+
+def schedule(post_id):
+    """Ставит нарезку в очередь, если она ещё не поставлена."""
+    with _in_flight_lock:
+        if post_id in _in_flight:
+            return
+        _in_flight.add(post_id)
+    run_in_background(generate, post_id)
+
+
+def schedule_on_commit(post_id):
+    transaction.on_commit(lambda: schedule(post_id))
+
+
+def thumbnail_or_fallback(image, name):
+    """Миниатюра, если готова; иначе нарезка в фоне и заменитель."""
+    if not image:
+        return None
+    thumbnail = lookup(image, name)
+    if thumbnail and is_ready(image):
+        return thumbnail
+    # нарезаются и недостающие варианты у картинок, загруженных до них
+    schedule(image.instance.pk)
+    return thumbnail or Fallback(
+        settings.THUMBNAIL_PLACEHOLDER_URL or image.url)
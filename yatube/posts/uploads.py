@@ -0,0 +1,89 @@
+"""Обработка загружаемых картинок постов.
+
+Загрузка больше `FILE_UPLOAD_MAX_MEMORY_SIZE` пишется Django во временный
+файл по частям, и Pillow читает её оттуда же, не поднимая целиком в
+память: размеры проверяются по заголовку до декодирования, а JPEG
+декодируется сразу в уменьшенном масштабе (`draft`).
+
+Картинка пересохраняется: поворот из EXIF применяется к пикселям, сами
+EXIF, XMP и комментарии отбрасываются (цветовой профиль остаётся), длинная
+сторона ограничивается `IMAGE_MAX_SIDE`. Непрозрачные картинки сохраняются
+прогрессивным JPEG, с прозрачностью — PNG; у анимированных GIF остаётся
+первый кадр. WebP-варианты нужных размеров
+нарезает `thumbnails`.
+"""
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+JPEG_QUALITY = 85
+
+
+class ImageUploadError(ValidationError):
+    pass
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA', 'PA') or (
+        image.mode == 'P' and 'transparency' in image.info)
+
+
+def _open(upload):
+    if upload.size > settings.IMAGE_UPLOAD_MAX_BYTES:
+        raise ImageUploadError(
+            'Файл больше %s' % filesizeformat(settings.IMAGE_UPLOAD_MAX_BYTES))
+    upload.seek(0)
+    try:
+        # читается только заголовок, пиксели ещё не декодированы
+        image = Image.open(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise ImageUploadError('Загрузите картинку')
+    width, height = image.size
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ImageUploadError(
+            f'Слишком большая картинка: {width}×{height} точек')
+    return image
+
+
+def _shrink(image, max_side):
+    if image.format == 'JPEG':
+        # декодер JPEG сразу уменьшает картинку в 2, 4 или 8 раз
+        image.draft('RGB', (max_side, max_side))
+    try:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    except (OSError, SyntaxError):
+        raise ImageUploadError('Картинка повреждена')
+    return image
+
+
+def normalize(upload):
+    """Пересохранённая картинка как `File` с новым именем.
+
+    Бросает `ImageUploadError`, если файл слишком большой или не картинка.
+    """
+    image = _open(upload)
+    icc_profile = image.info.get('icc_profile')
+    image = _shrink(image, settings.IMAGE_MAX_SIDE)
+    params = {'optimize': True}
+    if icc_profile:
+        params['icc_profile'] = icc_profile
+    if _has_alpha(image):
+        image = image.convert('RGBA')
+        params['format'] = 'PNG'
+        extension = 'png'
+    else:
+        image = image.convert('RGB')
+        params.update(format='JPEG', quality=JPEG_QUALITY, progressive=True)
+        extension = 'jpg'
+    output = tempfile.SpooledTemporaryFile(
+        max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    image.save(output, **params)
+    output.seek(0)
+    stem = os.path.splitext(os.path.basename(upload.name))[0] or 'image'
+    return File(output, name=f'{stem}.{extension}')
@@ -1,23 +1,74 @@
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import render, get_object_or_404, redirect
-from .models import Follow, Post, Group, User
-from django.core.paginator import Paginator
+from .models import Comment, Follow, Post, Group, User
+from django.conf import settings
+from django.db import transaction
 from posts.forms import PostForm, CommentForm
-from django.views.decorators.cache import cache_page
 from django.urls import reverse
-
-
-def to_paginate(p_iterable, page_number, posts_a_page=10):
-    paginator = Paginator(p_iterable, posts_a_page)
-    return paginator.get_page(page_number)
-
-
-@cache_page(20, key_prefix='index_page')
+from django.utils.http import urlencode
+from .cache import (
+    author_scope, cached_feed, conditional_feed, feed_scope, group_scope,
+    index_scope, post_scope,
+)
+from core.db import replica_reads
+from .feed import follow_feed, followed_heavy_authors
+from .idlists import FeedPaginator
+from .paginators import CursorPaginator
+from .search import search_page
+
+
+def paginate_feed(request, p_iterable, scopes, posts_a_page=10):
+    """Страница ленты: по курсору, если он включён или передан в URL.
+
+    Постраничный вывод по номеру берёт состав страницы из кеша лент
+    `scopes` (см. posts.idlists).
+    """
+    if settings.FEED_PAGINATION == 'cursor' or 'cursor' in request.GET:
+        paginator = CursorPaginator(p_iterable, posts_a_page)
+        return paginator.get_page(request.GET.get('cursor'))
+    paginator = FeedPaginator(p_iterable, posts_a_page, scopes)
+    return paginator.get_page(request.GET.get('page'))
+
+
+def comments_page(post_id, cursor):
+    """Комментарии к посту по курсору `(created, id)`, новые сверху."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        'author')
+    return CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, key='created',
+    ).get_page(cursor)
+
+
+def follow_button_scopes(request, username):
+    # кнопка «Подписаться»/«Отписаться» своя у каждого пользователя
+    if request.user.is_authenticated:
+        return [feed_scope(request.user.pk)]
+    return []
+
+
+def post_detail_scopes(request, post_id):
+    # счётчик постов автора меняется вместе с лентой автора
+    username = Post.objects.filter(pk=post_id).values_list(
+        'author__username', flat=True).first()
+    return [post_scope(post_id), author_scope(username)]
+
+
+def follow_scopes(request):
+    # посты «тяжёлых» авторов не раздаются по лентам, а подмешиваются
+    # при чтении, поэтому их ленты входят в версию отдельно; список
+    # запоминается в запросе, чтобы view не запрашивал его снова
+    if not hasattr(request, 'heavy_authors'):
+        request.heavy_authors = followed_heavy_authors(request.user)
+    return [feed_scope(request.user.pk)] + [
+        author_scope(username) for username in request.heavy_authors.values()
+    ]
+
+
+@replica_reads
+@cached_feed(lambda request: [index_scope()])
 def index(request):
-    posts_list = Post.objects.all()
-    page_num_from_url = request.GET.get('page')
-
-    page_obj = to_paginate(posts_list, page_num_from_url)
+    posts_list = Post.objects.for_feed()
+    page_obj = paginate_feed(request, posts_list, [index_scope()])
 
     context = {
         'page_obj': page_obj,
@@ -25,12 +76,12 @@ def index(request):
     return render(request, 'posts/index.html', context)
 
 
+@replica_reads
+@cached_feed(lambda request, slug: [group_scope(slug)])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_lists = group.posts.all()
-    page_num_from_url = request.GET.get('page')
-
-    page_obj = to_paginate(post_lists, page_num_from_url)
+    post_lists = group.posts.for_feed()
+    page_obj = paginate_feed(request, post_lists, [group_scope(slug)])
 
     context = {
         'group': group,
@@ -39,47 +90,71 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@replica_reads
+@cached_feed(
+    lambda request, username: [author_scope(username)],
+    personal=follow_button_scopes,
+)
 def profile(request, username):
-    user = get_object_or_404(User, username=username)
-    post_list = user.posts.select_related('group').all()
-    page_num_from_url = request.GET.get('page')
-
-    page_obj = to_paginate(post_list, page_num_from_url)
-
-    following = Follow.objects.filter(
-        user=request.user,
-        author=user,
-    ).exists()
-
+    user = get_object_or_404(
+        User.objects.select_related('stats'),
+        username=username,
+    )
+    post_list = user.posts.for_feed()
+    page_obj = paginate_feed(request, post_list, [author_scope(username)])
     context = {
         'author': user,
         'page_obj': page_obj,
-        'following': following,
     }
     return render(request, 'posts/profile.html', context)
 
 
+@replica_reads
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = search_page(query, request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_params': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@replica_reads
+@cached_feed(post_detail_scopes)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(Post.objects.for_feed(), pk=post_id)
     context = {
         'post': post,
-        'form': CommentForm,
-        'comments': comments,
+        'comments': comments_page(post_id, request.GET.get('comments')),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@replica_reads
+@cached_feed(lambda request, post_id: [post_scope(post_id)])
+def post_comments(request, post_id):
+    """Следующая страница комментариев HTML-фрагментом."""
+    get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post_id': post_id,
+        'comments': comments_page(post_id, request.GET.get('cursor')),
+    }
+    return render(request, 'includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, request.FILES or None)
     if form.is_valid():
         new_post = form.save(commit=False)
         new_post.author = request.user
-        new_post.save()
+        # счётчики и ленты меняются в той же транзакции, что и пост
+        with transaction.atomic():
+            new_post.save()
         return redirect('posts:profile', username=request.user.username)
 
-    form = PostForm()
     return render(request, 'posts/create_post.html', {
         'form': form,
         'is_edit': False
@@ -117,7 +192,8 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
@@ -126,14 +202,13 @@ def csrf_failure(request, reason=''):
 
 
 @login_required
+@replica_reads
+@conditional_feed(follow_scopes)
 def follow_index(request):
     # информация о текущем пользователе доступна в переменной request.user
-    favs = Follow.objects.filter(user=request.user).select_related('author')
-    favs = [entry.author for entry in favs]
-    posts_list = Post.objects.filter(author__in=favs)
-    page_num_from_url = request.GET.get('page')
-
-    page_obj = to_paginate(posts_list, page_num_from_url)
+    scopes = follow_scopes(request)
+    posts_list = follow_feed(request.user, request.heavy_authors)
+    page_obj = paginate_feed(request, posts_list, scopes)
 
     context = {
         'page_obj': page_obj,
@@ -145,10 +220,13 @@ def follow_index(request):
 def profile_follow(request, username):
     # Подписаться на автора
     author = get_object_or_404(User, username=username)
-    Follow.objects.create(
-        user=request.user,
-        author=author,
-    )
+    with transaction.atomic():
+        # транзакция начинается с BEGIN IMMEDIATE: проверку и вставку
+        # никто не разделит, так что get_or_create с его точкой
+        # сохранения не нужен
+        if not Follow.objects.filter(
+                user=request.user, author=author).exists():
+            Follow.objects.create(user=request.user, author=author)
     return redirect(reverse('posts:profile', args=(username,)))
 
 
@@ -156,6 +234,10 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     # Дизлайк, отписка
     author = get_object_or_404(User, username=username)
-    follow = get_object_or_404(Follow, user=request.user, author=author)
-    follow.delete()
+    with transaction.atomic():
+        follow = get_object_or_404(
+            Follow.objects.select_related('user', 'author'),
+            user=request.user, author=author,
+        )
+        follow.delete()
     return redirect(reverse('posts:profile', args=(username,)))
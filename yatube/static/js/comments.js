@@ -0,0 +1,25 @@
+// Подгрузка следующих страниц комментариев без перезагрузки поста:
+// кнопка «Показать ещё» заменяется HTML-фрагментом со следующей страницей
+// и новой кнопкой. Без JavaScript кнопка ведёт на страницу поста.
+document.addEventListener('click', function (event) {
+  var link = event.target.closest('.js-more-comments');
+  if (!link) {
+    return;
+  }
+  event.preventDefault();
+  link.classList.add('disabled');
+  fetch(link.dataset.fragment, {credentials: 'same-origin'})
+    .then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      return response.text();
+    })
+    .then(function (html) {
+      link.insertAdjacentHTML('beforebegin', html);
+      link.remove();
+    })
+    .catch(function () {
+      window.location = link.href;
+    });
+});
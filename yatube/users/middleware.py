@@ -0,0 +1,82 @@
+"""Пользователь запроса из кеша, без запроса к `auth_user`.
+
+`CachedAuthenticationMiddleware` заменяет `AuthenticationMiddleware`:
+поля пользователя, нужные страницам (имя, флаги доступа), хранятся в
+кеше `default` под ключом `user-snapshot:<id>`, и `request.user`
+собирается из них. Остальные поля модели отложены и при обращении
+дочитываются из базы, поэтому такой объект можно передавать в запросы
+и сохранять как обычный.
+
+Снимок сверяется с хешем пароля из сессии так же, как это делает
+`django.contrib.auth.get_user`; при расхождении пользователь читается из
+базы. Снимок удаляется при сохранении и удалении пользователя и при
+выходе из аккаунта (см. users.signals). С кешем в памяти процесса другие
+воркеры увидят изменения не позже чем через `USER_SNAPSHOT_TIMEOUT`.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+SNAPSHOT_KEY = 'user-snapshot:{}'
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'first_name', 'last_name',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def snapshot(user):
+    return {
+        'fields': {name: getattr(user, name) for name in SNAPSHOT_FIELDS},
+        'hash': user.get_session_auth_hash(),
+    }
+
+
+def forget(user_id):
+    cache.delete(SNAPSHOT_KEY.format(user_id))
+
+
+def _from_snapshot(data):
+    User = auth.get_user_model()
+    # from_db ждёт значения в порядке полей модели
+    names = [
+        field.attname for field in User._meta.concrete_fields
+        if field.attname in data['fields']
+    ]
+    return User.from_db(
+        DEFAULT_DB_ALIAS, names, [data['fields'][name] for name in names])
+
+
+def get_user(request):
+    """Пользователь сессии: из снимка или, если его нет, из базы."""
+    try:
+        user_id = auth._get_user_session_key(request)
+        backend = request.session[auth.BACKEND_SESSION_KEY]
+    except KeyError:
+        return auth.get_user(request)
+    key = SNAPSHOT_KEY.format(user_id)
+    data = cache.get(key)
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if (data is not None and backend in settings.AUTHENTICATION_BACKENDS
+            and session_hash
+            and constant_time_compare(session_hash, data['hash'])):
+        return _from_snapshot(data)
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(key, snapshot(user), settings.USER_SNAPSHOT_TIMEOUT)
+    return user
+
+
+def _lazy_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_user(request)
+    return request._cached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _lazy_user(request))
@@ -1,3 +1,64 @@
-# from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
-# Create your tests here.
+from .middleware import SNAPSHOT_KEY
+
+User = get_user_model()
+
+
+class CachedUserTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='leo', password='pass')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.login(username='leo', password='pass')
+        self.url = reverse('about:author')
+
+    def user_queries(self):
+        """Запросы к auth_user при показе страницы."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Пользователь: leo')
+        return [q['sql'] for q in queries if 'auth_user' in q['sql']]
+
+    def test_user_read_once(self):
+        self.assertTrue(self.user_queries())
+        self.assertEqual(self.user_queries(), [])
+
+    def test_rename_shown_at_once(self):
+        self.client.get(self.url)
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'lev'
+        user.save()
+        self.assertContains(self.client.get(self.url), 'Пользователь: lev')
+
+    def test_password_change_ends_sessions(self):
+        self.client.get(self.url)
+        user = User.objects.get(pk=self.user.pk)
+        user.set_password('other')
+        user.save()
+        self.assertContains(self.client.get(self.url), 'Войти')
+
+    def test_logout_forgets_snapshot(self):
+        self.client.get(self.url)
+        self.assertIsNotNone(cache.get(SNAPSHOT_KEY.format(self.user.pk)))
+        self.client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get(SNAPSHOT_KEY.format(self.user.pk)))
+
+    def test_cached_user_saved_without_losing_fields(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url)
+        user = response.wsgi_request.user
+        user.first_name = 'Лев'
+        user.save()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(user.first_name, 'Лев')
+        self.assertTrue(user.check_password('pass'))
@@ -11,10 +11,14 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
@@ -44,17 +48,21 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'users.apps.UsersConfig',
-    'core',
+    'core.apps.CoreConfig',
     'about',
+    'api',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.middleware.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # AuthenticationMiddleware, но пользователь читается из кеша
+    'users.middleware.CachedAuthenticationMiddleware',
+    'core.db.ReadYourWritesMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -88,11 +96,56 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 Django, но транзакции начинаются с BEGIN IMMEDIATE
+        'ENGINE': 'core.db_backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # соединение живёт между запросами, PRAGMA не выполняются заново
+        'CONN_MAX_AGE': int(os.environ.get('YATUBE_CONN_MAX_AGE', 600)),
+        # секунды ожидания чужой блокировки записи до `database is locked`
+        'OPTIONS': {'timeout': 20},
     }
 }
 
+# Выполняются на каждом новом соединении с SQLite (см. core.sqlite).
+# journal_mode=WAL сохраняется в самом файле базы, рядом появляются
+# db.sqlite3-wal и db.sqlite3-shm
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # отрицательное значение — размер в КиБ: 64 МиБ кеша страниц
+    'cache_size': -64000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+
+# Реплики только для чтения (см. core.db): YATUBE_DB_REPLICAS — пути к
+# файлам SQLite через запятую, локальные копии основной базы, которые
+# обновляет `manage.py sync_replicas`
+DATABASE_REPLICAS = []
+for number, name in enumerate(
+        filter(None, os.environ.get('YATUBE_DB_REPLICAS', '').split(',')),
+        1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'NAME': name,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica{number}')
+if TESTING:
+    # реплика для тестов маршрутизации; включается через DATABASE_REPLICAS
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.db.ReplicaRouter']
+# 'round_robin' или 'least_lag'
+REPLICA_SELECTION = os.environ.get('YATUBE_REPLICA_SELECTION', 'round_robin')
+# реплики, отставшие сильнее (в секундах), не используются
+REPLICA_MAX_LAG = 30
+REPLICA_LAG_TTL = 1
+# столько секунд после записи пользователь читает основную базу
+READ_YOUR_WRITES_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -144,13 +197,148 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    },
-    'index_page': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Бэкенд кеша выбирается переменной окружения YATUBE_CACHE:
+#   locmem    — память процесса (по умолчанию в тестах): у каждого воркера
+#               свои версии лент, и правка в одном не видна другим;
+#   file      — каталог на диске, общий для воркеров одной машины;
+#               `add` в нём не атомарен (проверка и запись раздельно),
+#               поэтому блокировка core.singleflight не исключает, что
+#               одну заготовку изредка пересчитают два воркера;
+#   sqlite    — файл SQLite в режиме WAL, общий для воркеров одной машины
+#               (по умолчанию вне тестов, `add` атомарен);
+#   redis     — сервер Redis (нужен пакет django-redis);
+#   memcached — сервер memcached (нужен пакет python-memcached).
+# YATUBE_CACHE_LOCATION переопределяет каталог, файл или адрес сервера.
+CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', ''),
+    'file': (
+        'django.core.cache.backends.filebased.FileBasedCache',
+        os.path.join(BASE_DIR, 'cache'),
+    ),
+    'sqlite': (
+        'core.cache_backends.SQLiteCache',
+        os.path.join(tempfile.gettempdir(), 'yatube-cache.sqlite3'),
+    ),
+    'redis': ('django_redis.cache.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'memcached': (
+        'django.core.cache.backends.memcached.MemcachedCache',
+        '127.0.0.1:11211',
+    ),
+}
+CACHE_BACKEND = os.environ.get(
+    'YATUBE_CACHE', 'locmem' if TESTING else 'sqlite')
+CACHE_SHARED = CACHE_BACKEND != 'locmem'
+_cache_class, _cache_location = CACHE_BACKENDS[CACHE_BACKEND]
+_cache_location = os.environ.get('YATUBE_CACHE_LOCATION', _cache_location)
+# Ключей в каждом кеше (у Django по умолчанию 300): страницы, списки id и
+# посты лент, карточки; при переполнении удаляется треть ключей.
+# Redis и memcached вытесняют ключи сами, по своим настройкам памяти
+CACHE_MAX_ENTRIES = int(os.environ.get('YATUBE_CACHE_MAX_ENTRIES', 100000))
+
+
+def _cache(alias):
+    """Настройки кеша `alias`; у каждого кеша своё пространство ключей."""
+    location, options = _cache_location, {}
+    if CACHE_BACKEND == 'locmem':
+        location = alias
+    elif CACHE_BACKEND == 'file':
+        location = os.path.join(_cache_location, alias)
+    elif CACHE_BACKEND == 'sqlite':
+        options['TABLE'] = f'cache_{alias}'
+    if CACHE_BACKEND in ('locmem', 'file', 'sqlite'):
+        options['MAX_ENTRIES'] = CACHE_MAX_ENTRIES
+    return {
+        'BACKEND': _cache_class,
+        'LOCATION': location,
+        'KEY_PREFIX': alias,
+        'OPTIONS': options,
     }
+
+
+CACHES = {
+    'default': _cache('default'),
+    'pages': _cache('pages'),
 }
 
+# С общим кешем сессии читаются из него, а в базу только пишутся;
+# с кешем в памяти процесса так делать нельзя: выход из аккаунта
+# не сбросит сессию в кешах других воркеров
+SESSION_ENGINE = os.environ.get(
+    'YATUBE_SESSION_ENGINE',
+    'django.contrib.sessions.backends.cached_db' if CACHE_SHARED
+    else 'django.contrib.sessions.backends.db',
+)
+
+# Страницы лент кешируются надолго: сохранение поста, группы или
+# комментария меняет версию ленты и сразу делает кеш неактуальным
+FEED_CACHE_ALIAS = 'pages'
+FEED_CACHE_TIMEOUT = 60 * 60
+# Промах по странице пересчитывает один воркер (core.singleflight):
+# остальные отдают прежнюю версию или ждут столько секунд; блокировка
+# пересчёта снимается сама, если воркер упал
+SINGLE_FLIGHT_WAIT = 2
+SINGLE_FLIGHT_LOCK_TIMEOUT = 30
+# За эту долю срока до истечения значение обновляется в фоне
+CACHE_REFRESH_AHEAD = 0.1
+# Отрисованные карточки постов; ключ включает время правки поста, а
+# версии его автора и группы хранятся вместе с карточкой
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Входит в ETag страниц: поменяйте при выкладке новых шаблонов, чтобы
+# браузеры не получали 304 на страницы со старой разметкой
+PAGE_ETAG_SALT = os.environ.get('YATUBE_RELEASE', '')
+
+# Снимок пользователя для request.user (см. users.middleware); с кешем в
+# памяти процесса живёт недолго: чужой воркер не узнает о смене пароля
+USER_SNAPSHOT_TIMEOUT = 60 * 60 if CACHE_SHARED else 60
+
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Под тестами фоновые задачи выполняются сразу, в том же потоке
+BACKGROUND_TASKS_WORKERS = 0 if TESTING else 2
+
+# Загрузки больше этого размера Django пишет во временный файл на диске
+FILE_UPLOAD_MAX_MEMORY_SIZE = 512 * 1024
+# Картинки постов: предельный размер файла, число точек до декодирования
+# и длинная сторона после пересохранения
+IMAGE_UPLOAD_MAX_BYTES = 10 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_MAX_SIDE = 2048
+
+# Миниатюры нарезаются в фоне; пока миниатюры нет, вместо неё выводится
+# оригинал или эта заглушка
+THUMBNAIL_PLACEHOLDER_URL = None
+
+# Лента подписок: посты авторов с большим числом подписчиков не раздаются
+# по лентам при публикации, а подмешиваются при чтении
+FEED_FANOUT_MAX_FOLLOWERS = 1000
+FEED_BATCH_SIZE = 500
+# Комментарии под постом выводятся страницами по курсору
+COMMENTS_PER_PAGE = 20
+# 'offset' — номера страниц с COUNT(*), 'cursor' — листание по курсору
+# без подсчёта; курсорный режим включается и параметром ?cursor=
+FEED_PAGINATION = 'offset'
+
+# Бэкенд поиска по постам (путь к классу из posts.search); None — FTS5 на
+# SQLite, иначе LIKE
+SEARCH_BACKEND = None
+
+# Профилирование запросов (core.middleware): запросы дольше PROFILING_SLOW_MS
+# попадают в лог yatube.slow_requests, сводка по view — /admin/profiling/
+PROFILING_ENABLED = True
+PROFILING_SLOW_MS = 500
+PROFILING_SAMPLES = 1000
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'yatube.slow_requests': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}